@@ -1,5 +1,5 @@
 import os
-import fitz  # PyMuPDF for PDF processing
+import html
 import pandas as pd
 from docx import Document
 from docx.shared import Inches
@@ -12,9 +12,12 @@ from dotenv import load_dotenv
 import re
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
 from reportlab.lib.units import mm
+from docx_stream import iter_docx_text
+from pdf_engines import iter_page_text, iter_page_blocks, resolve_pdf_engine
+from pdf_inplace import translate_pdf_in_place
+import font_registry
+import tracing
 
 load_dotenv()
 
@@ -25,42 +28,29 @@ client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 SECONDARY_LANG = "Hindi"  # Change to 'Japanese' for final release
 
 class FileTranslator:
-    def __init__(self):
+    def __init__(self, pdf_engine=None, rate_limiter=None):
         self.supported_formats = ['.pdf', '.docx', '.xlsx', '.txt']
+        # 'pymupdf' (default) or 'pdfplumber'; falls back to pdfplumber if PyMuPDF is missing
+        self.pdf_engine = resolve_pdf_engine(pdf_engine)
+        # Optional object with acquire(), called before every Gemini request (shared across threads in batch runs)
+        self.rate_limiter = rate_limiter
+        # Load and validate output fonts once, up front
+        font_registry.warm_up()
         
-    def extract_text_from_pdf(self, pdf_path, use_ocr=False):
+    def extract_text_from_pdf(self, pdf_path, use_ocr=False, engine=None):
         """Extract text from PDF with optional OCR for images"""
-        text_content = []
-        
         try:
-            # Use pdfplumber for better text extraction with structure preservation
-            import pdfplumber
-            
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    # Extract text with positioning information
-                    text = page.extract_text()
-                
-                # If no text found and OCR is enabled, try OCR
-                if not text.strip() and use_ocr:
-                        # Convert page to image for OCR
-                        img = page.to_image()
-                        ocr_text = pytesseract.image_to_string(img.original, lang='jpn+eng')
-                        text = ocr_text
-                
-                text_content.append(text)
-            
+            with tracing.span('extract.pdf', engine=engine or self.pdf_engine, ocr=use_ocr) as span:
+                text_content = list(iter_page_text(pdf_path, engine or self.pdf_engine, use_ocr))
+                span.set(pages=len(text_content))
             return "\n".join(text_content)
             
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
     
-    def pdf_to_html_with_structure(self, pdf_path):
-        """Convert PDF to HTML while preserving structure using pdfplumber"""
+    def pdf_to_html_with_structure(self, pdf_path, engine=None):
+        """Convert PDF to HTML while preserving structure"""
         try:
-            import pdfplumber
-            from bs4 import BeautifulSoup
-            
             html_content = []
             html_content.append("""
             <!DOCTYPE html>
@@ -77,34 +67,25 @@ class FileTranslator:
             <body>
             """)
             
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    html_content.append(f'<div class="page" id="page-{page_num + 1}">')
-                    
-                    # Extract text blocks with positioning
-                    text_blocks = page.extract_text_blocks()
-                    
-                    if text_blocks:
-                        for block in text_blocks:
-                            if block.get('text', '').strip():
-                                # Preserve some formatting based on font size
-                                font_size = block.get('size', 12)
-                                if font_size > 14:
-                                    html_content.append(f'<h2 class="text-block">{block["text"]}</h2>')
-                                elif font_size > 12:
-                                    html_content.append(f'<h3 class="text-block">{block["text"]}</h3>')
-                                else:
-                                    html_content.append(f'<p class="text-block">{block["text"]}</p>')
-                    else:
-                        # Fallback to simple text extraction
-                        text = page.extract_text()
-                        if text.strip():
-                            paragraphs = text.split('\n\n')
-                            for para in paragraphs:
-                                if para.strip():
-                                    html_content.append(f'<p class="paragraph">{para.strip()}</p>')
-                    
-                    html_content.append('</div>')
+            for page_num, text, text_blocks in iter_page_blocks(pdf_path, engine or self.pdf_engine):
+                html_content.append(f'<div class="page" id="page-{page_num + 1}">')
+                
+                if text_blocks:
+                    for block in text_blocks:
+                        if block.get('text', '').strip():
+                            # Preserve some formatting based on the block's font-size tier
+                            tier = block.get('tier', 'p')
+                            block_text = html.escape(block['text'])
+                            html_content.append(f'<{tier} class="text-block">{block_text}</{tier}>')
+                else:
+                    # Fallback to simple text extraction
+                    if text.strip():
+                        paragraphs = text.split('\n\n')
+                        for para in paragraphs:
+                            if para.strip():
+                                html_content.append(f'<p class="paragraph">{html.escape(para.strip())}</p>')
+                
+                html_content.append('</div>')
             
             html_content.append("</body></html>")
             return '\n'.join(html_content)
@@ -112,8 +93,11 @@ class FileTranslator:
         except Exception as e:
             raise Exception(f"Error converting PDF to HTML: {str(e)}")
     
-    def translate_html_content(self, html_content, source_lang, target_lang):
-        """Translate text content within HTML while preserving structure"""
+    def translate_html_content(self, html_content, source_lang, target_lang, translated_blocks=None, should_stop=None):
+        """Translate text content within HTML while preserving structure; translations are also appended to translated_blocks.
+
+        Raises as soon as should_stop() returns True.
+        """
         try:
             from bs4 import BeautifulSoup
             
@@ -121,10 +105,15 @@ class FileTranslator:
             
             # Translate text nodes but preserve HTML structure
             for element in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'span', 'div']):
+                # Outside the per-element try, so a stop request is not mistaken for a failed element
+                if should_stop and should_stop():
+                    raise Exception("Translation cancelled")
                 if element.string and element.string.strip():
                     try:
                         translated_text = self.translate_text(element.string.strip(), source_lang, target_lang)
                         element.string = translated_text
+                        if translated_blocks is not None:
+                            translated_blocks.append(translated_text)
                     except Exception as e:
                         # Keep original text if translation fails
                         continue
@@ -137,63 +126,27 @@ class FileTranslator:
     def html_to_pdf_with_fonts(self, html_content, output_path, target_lang=None):
         """Convert HTML to PDF with proper font support"""
         try:
-            from weasyprint import HTML, CSS
-            from weasyprint.text.fonts import FontConfiguration
+            from weasyprint import HTML
             
-            # Configure fonts based on target language
-            if target_lang and (target_lang.lower() == 'hindi' or target_lang.lower() == 'hin'):
-                # Use Devanagari font for Hindi
-                css_content = """
-                @font-face {
-                    font-family: 'Noto Sans Devanagari';
-                    src: url('Tiro_Devanagari_Hindi/NotoSansDevanagari-Regular.ttf') format('truetype');
-                }
-                body { 
-                    font-family: 'Noto Sans Devanagari', Arial, sans-serif; 
-                    margin: 20px; 
-                }
-                .page { page-break-after: always; margin-bottom: 20px; }
-                .text-block { margin: 5px 0; }
-                .paragraph { margin: 10px 0; }
-                """
-            else:
-                # Use Japanese font for Japanese
-                css_content = """
-                @font-face {
-                    font-family: 'Noto Sans JP';
-                    src: url('Noto_Sans_JP/NotoSansJP-VariableFont_wght.ttf') format('truetype');
-                }
-                body { 
-                    font-family: 'Noto Sans JP', Arial, sans-serif; 
-                    margin: 20px; 
-                }
-                .page { page-break-after: always; margin-bottom: 20px; }
-                .text-block { margin: 5px 0; }
-                .paragraph { margin: 10px 0; }
-                """
+            # Shared font configuration and stylesheet, built once per process and target script
+            font_config, css = font_registry.weasyprint_resources(target_lang)
             
-            # Configure font
-            font_config = FontConfiguration()
-            css = CSS(string=css_content, font_config=font_config)
-            
-            # Convert HTML to PDF
-            HTML(string=html_content).write_pdf(
-                output_path,
-                stylesheets=[css],
-                font_config=font_config
-            )
+            # Convert HTML to PDF (WeasyPrint embeds only the glyphs used)
+            with font_registry.render_lock, tracing.span('render', mode='html', bytes=len(html_content.encode('utf-8'))) as span:
+                document = HTML(string=html_content).render(stylesheets=[css], font_config=font_config)
+                document.write_pdf(output_path)
+                span.set(pages=len(document.pages))
             
         except Exception as e:
             raise Exception(f"Error converting HTML to PDF: {str(e)}")
     
-    def extract_text_from_docx(self, docx_path):
-        """Extract text from Word document"""
+    def extract_text_from_docx(self, docx_path, progress_callback=None, should_stop=None):
+        """Extract text from Word document by streaming word/document.xml"""
         try:
-            doc = Document(docx_path)
             text_content = []
             
-            for paragraph in doc.paragraphs:
-                text_content.append(paragraph.text)
+            for kind, text in iter_docx_text(docx_path, progress_callback, should_stop):
+                text_content.append(text)
             
             return "\n".join(text_content)
             
@@ -221,7 +174,12 @@ class FileTranslator:
     def extract_text_from_file(self, file_path, use_ocr=False):
         """Extract text from any supported file format"""
         file_extension = os.path.splitext(file_path)[1].lower()
-        
+        with tracing.span('extract', format=file_extension, bytes=os.path.getsize(file_path)) as span:
+            text = self._extract_text(file_path, file_extension, use_ocr)
+            span.set(chars=len(text))
+        return text
+
+    def _extract_text(self, file_path, file_extension, use_ocr=False):
         if file_extension == '.pdf':
             return self.extract_text_from_pdf(file_path, use_ocr)
         elif file_extension == '.docx':
@@ -261,35 +219,140 @@ class FileTranslator:
             Provide only the translated text without any additional explanations.
             """
             
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            with tracing.span('translate.chunk', source=source, target=target, bytes=len(text.encode('utf-8'))) as span:
+                response = client.models.generate_content(
+                    model="gemini-2.5-flash",
+                    contents=prompt
+                )
+                span.set(output_bytes=len(response.text.encode('utf-8')))
             
             return response.text.strip()
             
         except Exception as e:
             raise Exception(f"Translation error: {str(e)}")
 
-    def save_translated_pdf(self, original_path, translated_text, output_path, font_path=None, preserve_structure=True, source_lang=None, target_lang=None):
-        """Save translated text as PDF, preserving structure if requested. Use Hindi or Japanese font as needed."""
+    def translate_stream(self, pieces, source_lang, target_lang, max_chars=4000):
+        """Translate an iterable of text pieces in bounded batches, yielding each translated batch as soon as it is ready"""
+        for batch in batch_text_pieces(pieces, max_chars):
+            yield self.translate_text(batch, source_lang, target_lang)
+
+    def translate_text_file_streaming(self, input_path, output_path, source_lang, target_lang, max_tokens=1500, workers=4, progress_callback=None):
+        """Translate a large .txt file in constant memory.
+
+        Lines are read incrementally and grouped into token-bounded batches; up to `workers` batches
+        are translated concurrently and appended to output_path in their original order as soon as
+        they are done, so partial output is available early. progress_callback(fraction, batches_done,
+        last_translated_batch) is called after every written batch.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from collections import deque
+
+        total_bytes = os.path.getsize(input_path) or 1
+        bytes_read = [0]
+
+        def lines():
+            with open(input_path, 'rb') as f:
+                for raw in f:
+                    bytes_read[0] += len(raw)
+                    yield raw.decode('utf-8').rstrip('\r\n')
+
+        batches_done = 0
+        # Bounded look-ahead keeps memory flat however large the input is
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor, open(output_path, 'w', encoding='utf-8') as out:
+            def write_oldest():
+                nonlocal batches_done
+                translated = pending.popleft().result()
+                out.write(translated + "\n")
+                out.flush()
+                batches_done += 1
+                if progress_callback:
+                    progress_callback(min(bytes_read[0] / total_bytes, 1.0), batches_done, translated)
+
+            try:
+                for batch in batch_text_pieces(lines(), max_tokens, estimate_tokens):
+                    if not batch.strip():
+                        # Blank runs need no translation but keep their place in the output
+                        pending.append(executor.submit(lambda text=batch: text))
+                    else:
+                        # propagate: chunk spans from pool threads still land in the caller's trace
+                        pending.append(executor.submit(tracing.propagate(self.translate_text), batch, source_lang, target_lang))
+                    if len(pending) >= workers * 2:
+                        write_oldest()
+                while pending:
+                    write_oldest()
+            except BaseException:
+                # Don't start batches nobody will write
+                for future in pending:
+                    future.cancel()
+                raise
+        return batches_done
+
+    def translate_blocks(self, texts, source_lang, target_lang):
+        """Translate a list of text blocks in one request, keeping their order. Falls back to one request per block."""
+        if not texts:
+            return []
+        numbered = "\n".join(f"[[{i}]] {text}" for i, text in enumerate(texts))
+        translated = self.translate_text(numbered, source_lang, target_lang)
+        parts = re.split(r"\[\[(\d+)\]\]", translated)
+        by_index = {}
+        for i in range(1, len(parts) - 1, 2):
+            by_index[int(parts[i])] = parts[i + 1].strip()
+        if sorted(by_index) == list(range(len(texts))):
+            return [by_index[i] for i in range(len(texts))]
+        # Markers were not preserved; translate block by block instead
+        return [self.translate_text(text, source_lang, target_lang) for text in texts]
+
+    def save_translated_pdf(self, original_path, translated_text, output_path, font_path=None, preserve_structure=True, source_lang=None, target_lang=None, layout_mode='inplace'):
+        """Save translated text as PDF, preserving structure if requested. Use Hindi or Japanese font as needed.
+
+        layout_mode 'inplace' replaces text blocks on the original pages (needs PyMuPDF);
+        'html' rebuilds the document through HTML and WeasyPrint.
+        """
         if preserve_structure and source_lang and target_lang:
             try:
-                # Convert PDF to HTML with structure
-                html_content = self.pdf_to_html_with_structure(original_path)
-                
-                # Translate the HTML content
-                translated_html = self.translate_html_content(html_content, source_lang, target_lang)
-                
-                # Convert back to PDF with proper fonts
-                self.html_to_pdf_with_fonts(translated_html, output_path, target_lang)
-                
+                self.translate_pdf_layout(original_path, output_path, source_lang, target_lang, layout_mode)
             except Exception as e:
                 # Fallback to simple text approach
+                print(f"Structure-preserving PDF output failed ({str(e)}), using simple layout")
                 self.save_translated_pdf_simple(translated_text, output_path, target_lang)
         else:
             self.save_translated_pdf_simple(translated_text, output_path, target_lang)
     
+    def translate_pdf_layout(self, original_path, output_path, source_lang, target_lang, layout_mode='inplace', should_stop=None):
+        """Translate a PDF block by block while rebuilding its layout, and return the translated text.
+
+        Each block is translated exactly once, so no separate whole-document translation is needed.
+        Raises as soon as should_stop() returns True (checked before every page or element).
+        """
+        translated_blocks = []
+        if layout_mode == 'inplace' and self.pdf_engine == 'pymupdf':
+            def translate(texts):
+                if should_stop and should_stop():
+                    raise Exception("Translation cancelled")
+                translations = self.translate_blocks(texts, source_lang, target_lang)
+                translated_blocks.extend(translations)
+                return translations
+
+            # Keep the original pages and swap each text block for its translation
+            with tracing.span('render', mode='inplace', bytes=os.path.getsize(original_path)):
+                translate_pdf_in_place(original_path, output_path, translate, target_lang)
+            return "\n\n".join(translated_blocks)
+
+        # Convert PDF to HTML with structure
+        with tracing.span('html.build') as span:
+            html_content = self.pdf_to_html_with_structure(original_path)
+            span.set(bytes=len(html_content.encode('utf-8')))
+
+        # Translate the HTML content
+        translated_html = self.translate_html_content(html_content, source_lang, target_lang, translated_blocks, should_stop)
+
+        # Convert back to PDF with proper fonts
+        self.html_to_pdf_with_fonts(translated_html, output_path, target_lang)
+        return "\n\n".join(translated_blocks)
+
     def save_translated_pdf_simple(self, translated_text, output_path, target_lang=None):
         """Simple PDF generation without structure preservation"""
         try:
@@ -297,32 +360,20 @@ class FileTranslator:
             from reportlab.lib.pagesizes import A4
             from reportlab.lib.units import mm
             
-            # Select font based on target_lang
-            if target_lang and (target_lang.lower() == 'hindi' or target_lang.lower() == 'hin'):
-                font_path = "Tiro_Devanagari_Hindi/NotoSansDevanagari-Regular.ttf"
-                font_name = "NotoSansDevanagariRegular"
-            else:
-                font_path = "Noto_Sans_JP/NotoSansJP-VariableFont_wght.ttf"
-                font_name = "NotoSansJP"
-            
-                font_path = os.path.abspath(font_path)
-                if not os.path.exists(font_path):
-                    print(f"DEBUG: Font file not found at {font_path}")
-                    raise Exception(f"Font file not found: {font_path}.")
+            # Font is loaded and registered once per process (reportlab subsets it on save)
+            font = font_registry.get_font(target_lang)
+            font_name = font['reportlab_name'] if font else font_registry.DEFAULT_REPORTLAB_FONT
             
-                # Register font only if not already registered
-                if font_name not in pdfmetrics.getRegisteredFontNames():
-                    pdfmetrics.registerFont(TTFont(font_name, font_path))
-            
-                c = canvas.Canvas(output_path, pagesize=A4)
-                width, height = A4
-                c.setFont(font_name, 12)
-                margin_x = 20 * mm
-                margin_y = 20 * mm
-                line_height = 15
-                x = margin_x
-                y = height - margin_y
+            c = canvas.Canvas(output_path, pagesize=A4)
+            width, height = A4
+            c.setFont(font_name, 12)
+            margin_x = 20 * mm
+            margin_y = 20 * mm
+            line_height = 15
+            x = margin_x
+            y = height - margin_y
             
+            with tracing.span('render', mode='simple', bytes=len(translated_text.encode('utf-8'))) as span:
                 for line in translated_text.split('\n'):
                     if y - line_height < margin_y:
                         c.showPage()
@@ -330,7 +381,8 @@ class FileTranslator:
                         y = height - margin_y
                     c.drawString(x, y, line)
                     y -= line_height
-            
+                
+                span.set(pages=c.getPageNumber())
                 c.save()
             
         except Exception as e:
@@ -339,18 +391,22 @@ class FileTranslator:
     def save_translated_docx(self, original_path, translated_text, output_path, target_lang=None):
         """Save translated text as Word document, using Devanagari font for Hindi output."""
         try:
+            from docx.oxml.ns import qn
+            
             doc = Document()
             # Split text into paragraphs
             paragraphs = translated_text.split('\n\n')
             # Choose font for Hindi
             use_hindi_font = target_lang and (target_lang.lower() == 'hindi' or target_lang.lower() == 'hin')
-            hindi_font_name = "Mangal"  # Or use 'Noto Sans Devanagari' if installed
+            hindi_font_name = font_registry.FONT_SPECS['devanagari']['docx_name']
             for para in paragraphs:
                 if para.strip():
                     p = doc.add_paragraph(para.strip())
                     if use_hindi_font:
                         for run in p.runs:
                             run.font.name = hindi_font_name
+                            # Devanagari is complex script text, which Word styles via w:cs
+                            run._element.get_or_add_rPr().get_or_add_rFonts().set(qn('w:cs'), hindi_font_name)
             doc.save(output_path)
         except Exception as e:
             raise Exception(f"Error saving Word document: {str(e)}")
@@ -368,6 +424,11 @@ class FileTranslator:
     def save_translated_file(self, original_path, translated_text, output_path, **kwargs):
         """Save translated text in the same format as original"""
         file_extension = os.path.splitext(original_path)[1].lower()
+        with tracing.span('save', format=file_extension) as span:
+            self._save_file(original_path, translated_text, output_path, file_extension, **kwargs)
+            span.set(bytes=os.path.getsize(output_path))
+
+    def _save_file(self, original_path, translated_text, output_path, file_extension, **kwargs):
         if file_extension == '.pdf':
             self.save_translated_pdf(original_path, translated_text, output_path, **kwargs)
         elif file_extension == '.docx':
@@ -382,7 +443,7 @@ class FileTranslator:
         else:
             raise Exception(f"Unsupported file format for saving: {file_extension}")
     
-    def translate_file(self, file_path, source_lang, target_lang, use_ocr=False, output_path=None):
+    def translate_file(self, file_path, source_lang, target_lang, use_ocr=False, output_path=None, layout_mode='inplace'):
         """Complete file translation process"""
         try:
             file_extension = os.path.splitext(file_path)[1].lower()
@@ -390,16 +451,21 @@ class FileTranslator:
             original_text = self.extract_text_from_file(file_path, use_ocr)
             if not original_text.strip():
                 raise Exception("No text content found in the file")
-            print(f"Translating from {source_lang} to {target_lang}...")
-            translated_text = self.translate_text(original_text, source_lang, target_lang)
             if output_path is None:
                 base_name = os.path.splitext(file_path)[0]
                 extension = os.path.splitext(file_path)[1]
                 output_path = f"{base_name}_translated_{target_lang}{extension}"
-            if file_extension == '.pdf':
-                self.save_translated_file(file_path, translated_text, output_path, preserve_structure=True, source_lang=source_lang, target_lang=target_lang)
-            else:
-                self.save_translated_file(file_path, translated_text, output_path)
+            print(f"Translating from {source_lang} to {target_lang}...")
+            translated_text = None
+            if file_extension == '.pdf' and layout_mode:
+                # Blocks are translated once while the layout is rebuilt
+                try:
+                    translated_text = self.translate_pdf_layout(file_path, output_path, source_lang, target_lang, layout_mode)
+                except Exception as e:
+                    print(f"Structure-preserving PDF output failed ({str(e)}), using simple layout")
+            if translated_text is None:
+                translated_text = self.translate_text(original_text, source_lang, target_lang)
+                self.save_translated_file(file_path, translated_text, output_path, target_lang=target_lang)
             return {
                 'original_text': original_text,
                 'translated_text': translated_text,
@@ -413,8 +479,48 @@ class FileTranslator:
             }
 
 # Utility functions
+# Unicode ranges per script for local language detection: (start, end, script)
+SCRIPT_RANGES = [
+    (0x0041, 0x005A, 'latin'), (0x0061, 0x007A, 'latin'), (0x00C0, 0x024F, 'latin'),
+    (0x0900, 0x097F, 'devanagari'), (0xA8E0, 0xA8FF, 'devanagari'),
+    (0x3040, 0x309F, 'kana'), (0x30A0, 0x30FF, 'kana'), (0x31F0, 0x31FF, 'kana'), (0xFF66, 0xFF9F, 'kana'),
+    (0x3400, 0x4DBF, 'han'), (0x4E00, 0x9FFF, 'han'),
+]
+SCRIPT_LANGUAGES = {'latin': "English", 'devanagari': "Hindi", 'kana': "Japanese", 'han': "Japanese"}
+LOCAL_DETECTION_CONFIDENCE = 0.8
+LOCAL_DETECTION_MIN_LETTERS = 20
+
+def detect_language_local(text, sample_size=2000):
+    """Classify text by Unicode script distribution. Returns (language, confidence between 0 and 1)."""
+    counts = {'latin': 0, 'devanagari': 0, 'kana': 0, 'han': 0}
+    for ch in text[:sample_size]:
+        code = ord(ch)
+        if code < 0x41:
+            continue
+        for start, end, script in SCRIPT_RANGES:
+            if start <= code <= end:
+                counts[script] += 1
+                break
+    # Kanji and kana are both Japanese
+    japanese = counts['kana'] + counts['han']
+    totals = {'English': counts['latin'], 'Hindi': counts['devanagari'], 'Japanese': japanese}
+    letters = sum(totals.values())
+    if not letters:
+        return "Unknown", 0.0
+    language = max(totals, key=totals.get)
+    confidence = totals[language] / letters
+    if language == "Japanese" and counts['kana'] == 0:
+        # Han without any kana could just as well be Chinese
+        confidence *= 0.6
+    # Very short samples are not reliable
+    confidence *= min(1.0, letters / LOCAL_DETECTION_MIN_LETTERS)
+    return language, confidence
+
 def detect_language(text):
-    """Detect the language of the text"""
+    """Detect the language of the text locally, asking Gemini only when the script mix is ambiguous"""
+    language, confidence = detect_language_local(text)
+    if confidence >= LOCAL_DETECTION_CONFIDENCE:
+        return language
     try:
         prompt = f"""
         Detect the language of the following text. Respond with only the language name (e.g., "Japanese", "English").
@@ -432,7 +538,27 @@ def detect_language(text):
         return response.text.strip()
         
     except Exception as e:
-        return "Unknown"
+        return language if confidence > 0 else "Unknown"
+
+def estimate_tokens(text):
+    """Rough LLM token count: ~4 ASCII characters per token, ~1 token per other character (CJK, Devanagari)"""
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+def batch_text_pieces(pieces, max_size=4000, measure=len):
+    """Group text pieces into newline-joined batches whose measured size stays within max_size (a single larger piece is its own batch)"""
+    batch = []
+    batch_size = 0
+    for piece in pieces:
+        piece_size = measure(piece) + 1
+        if batch and batch_size + piece_size > max_size:
+            yield "\n".join(batch)
+            batch = []
+            batch_size = 0
+        batch.append(piece)
+        batch_size += piece_size
+    if batch:
+        yield "\n".join(batch)
 
 def validate_file_format(file_path):
     """Validate if file format is supported"""
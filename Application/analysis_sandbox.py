@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import queue
+from collections import OrderedDict
+
+import tracing
+
+# Generated analysis code runs in these worker processes, never in the Streamlit server
+POOL_SIZE = int(os.getenv("SANDBOX_WORKERS", "2"))
+CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "20"))
+WALL_SECONDS = int(os.getenv("SANDBOX_WALL_SECONDS", "30"))
+# Memory for the analysis itself, on top of the worker's loaded datasets
+MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "1536"))
+CHECKOUT_TIMEOUT = 60
+# Datasets kept loaded per worker. Text columns stay on the memory-mapped file, but numbers and
+# categoricals are copied into the heap, so every cached frame raises the worker's memory limit
+WORKER_DATASETS = 4
+MB = 1024 * 1024
+
+
+class SandboxError(Exception):
+    pass
+
+
+# --- Worker side ---
+
+def _worker_main(conn, memory_mb, cpu_seconds):
+    """Worker loop: receive (code, dataset hash), return PNG bytes of the resulting `fig` or an error"""
+    import resource
+    import signal
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    import figure_cache
+    import survey_store
+
+    # RLIMIT_DATA covers the heap and anonymous mappings, not the file-backed dataset mapping. Only the
+    # soft limit moves, so it can grow again when a larger dataset is loaded
+    data_hard = resource.getrlimit(resource.RLIMIT_DATA)[1]
+
+    def set_data_limit(nbytes):
+        soft = nbytes if data_hard == resource.RLIM_INFINITY else min(nbytes, data_hard)
+        resource.setrlimit(resource.RLIMIT_DATA, (soft, data_hard))
+
+    limit = memory_mb * MB
+    set_data_limit(limit)
+
+    def on_cpu_limit(signum, frame):
+        raise SandboxError(f"The analysis used more than {cpu_seconds}s of CPU time and was stopped.")
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+    cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+
+    datasets = OrderedDict()  # hash -> (frame, bytes it holds outside the mapped file)
+    while True:
+        try:
+            code, dataset_hash = conn.recv()
+        except EOFError:
+            return
+        # CPU limits are per process, so each task gets a fresh budget on top of what was used so far.
+        # Only the soft limit moves (a lowered hard limit cannot be raised again); code that swallows
+        # the SIGXCPU error is still stopped by the server's wall-clock timeout
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_seconds, cpu_hard))
+        try:
+            if dataset_hash not in datasets:
+                while len(datasets) >= WORKER_DATASETS:
+                    datasets.popitem(last=False)
+                datasets[dataset_hash] = _load_dataset(survey_store, dataset_hash, limit, sum(size for _, size in datasets.values()), set_data_limit)
+            datasets.move_to_end(dataset_hash)
+            # The analysis budget comes on top of what the cached frames already hold
+            set_data_limit(limit + sum(size for _, size in datasets.values()))
+            # Shallow copy so code that adds columns does not change the cached frame for later tasks
+            scope = {"df": datasets[dataset_hash][0].copy(deep=False), "plt": plt, "sns": sns, "pd": pd}
+            exec(code, scope)
+            fig = scope.get("fig")
+            if fig is None:
+                raise SandboxError("The generated code did not create a figure named `fig`.")
+            reply = ("ok", figure_cache.to_png(fig))
+        except SandboxError as e:
+            reply = ("error", str(e))
+        except MemoryError:
+            reply = ("error", f"The analysis needed more than {memory_mb} MB of memory beyond the dataset and was stopped.")
+        except BaseException as e:
+            reply = ("error", f"{type(e).__name__}: {str(e)}")
+        finally:
+            plt.close("all")
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+        try:
+            conn.send(reply)
+        except (BrokenPipeError, EOFError):
+            return
+
+
+def _load_dataset(survey_store, dataset_hash, limit, cached_bytes, set_data_limit):
+    """Load a dataset with room for its in-memory columns; returns (frame, bytes held outside the mapped file)"""
+    expected = 0
+    try:
+        # Arrow size of the mapped columns bounds what conversion copies; twice that covers temporaries
+        expected = survey_store.open_table(dataset_hash).nbytes
+        set_data_limit(limit + cached_bytes + 2 * expected)
+        frame = survey_store.load_dataframe(dataset_hash)
+    except MemoryError:
+        size = f" ({expected // MB} MB in memory)" if expected else ""
+        raise SandboxError(f"The dataset is too large to load for analysis{size}. Try a smaller extract of the survey.")
+    return frame, int(frame.memory_usage(index=True, deep=False).sum())
+
+
+# --- Server side ---
+
+class SandboxWorker:
+    def __init__(self, context, memory_mb, cpu_seconds):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_mb, cpu_seconds), daemon=True, name="analysis-sandbox")
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(5)
+        except Exception:
+            pass
+        self.conn.close()
+
+
+class SandboxPool:
+    """Pre-started worker processes that run generated plotting code under CPU, wall-clock and memory limits.
+
+    Workers load the stored Arrow dataset themselves (only the hash is sent), with a memory limit sized
+    from the datasets they hold, and return PNG bytes; a worker that hits the wall-clock limit or dies
+    is replaced.
+    """
+
+    def __init__(self, size=POOL_SIZE, memory_mb=MEMORY_MB, cpu_seconds=CPU_SECONDS, wall_seconds=WALL_SECONDS):
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        # spawn: never fork the (multi-threaded) Streamlit server
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        return SandboxWorker(self._context, self.memory_mb, self.cpu_seconds)
+
+    def run(self, code, dataset_hash):
+        """Execute code against the dataset and return the PNG bytes of its figure"""
+        try:
+            worker = self._idle.get(timeout=CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            raise SandboxError("All analysis workers are busy. Please try again shortly.")
+        healthy = False
+        try:
+            if not worker.process.is_alive():
+                worker.kill()
+                worker = self._start_worker()
+            # Timed under the caller's active tracer, if any
+            with tracing.span('sandbox.run', dataset=dataset_hash[:12]) as span:
+                try:
+                    worker.conn.send((code, dataset_hash))
+                    if not worker.conn.poll(self.wall_seconds):
+                        raise SandboxError(f"The analysis took longer than {self.wall_seconds}s and was stopped.")
+                    status, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    raise SandboxError("The analysis worker stopped unexpectedly (likely out of memory or CPU time).")
+                healthy = True
+                if status != "ok":
+                    raise SandboxError(payload)
+                span.set(bytes=len(payload))
+            return payload
+        finally:
+            if not healthy:
+                worker.kill()
+                worker = self._start_worker()
+            self._idle.put(worker)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
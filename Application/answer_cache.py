@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import survey_profile
+import survey_store
+
+# Analyzer answers per dataset, shared by every session on this server
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.85"))
+ENTRIES_PER_DATASET = int(os.getenv("ANSWER_CACHE_ENTRIES", "256"))
+MAX_DATASETS = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Follow-ups ("make it a pie chart") depend on the conversation, not just the question
+_FOLLOW_UP = re.compile(r"\b(it|its|that|this|these|those|them|previous|last|above|again|instead|same|also)\b")
+
+# Words that do not change what is being asked (every answer is about the respondents), and common rephrasings
+_FILLER = {"a", "an", "the", "of", "for", "in", "me", "show", "give", "display", "see", "please", "can", "could", "you", "i",
+           "what", "whats", "is", "are", "s", "do", "does", "how", "many", "much", "plot", "chart", "graph", "number",
+           "respondent", "response", "answer", "count", "people"}
+_SYNONYMS = {"per": "by", "across": "by", "histogram": "distribution", "breakdown": "distribution", "distributed": "distribution",
+             "avg": "average", "mean": "average"}
+
+
+def normalize(question):
+    """Lowercase words in singular form, without filler and with synonyms unified: "ages histogram" -> "age distribution" """
+    words = (_singular(w) for w in re.sub(r"[^\w\s]", " ", question.lower()).split())
+    return " ".join(_SYNONYMS.get(w, w) for w in words if w not in _FILLER)
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def is_cacheable(question):
+    text = normalize(question)
+    return len(text) >= 3 and not _FOLLOW_UP.search(text)
+
+
+def lookup(dataset_hash, question, threshold=SIMILARITY_THRESHOLD):
+    """Stored (message, matched question) for the most similar earlier question on this dataset, or None"""
+    if not is_cacheable(question):
+        return None
+    text = normalize(question)
+    with _cache_lock:
+        entries = _cache.get(dataset_hash)
+        if not entries:
+            return None
+        _cache.move_to_end(dataset_hash)
+        if text in entries:
+            entries.move_to_end(text)
+            return entries[text]
+        questions = list(entries)
+    best, score = _most_similar(text, questions)
+    if score < threshold:
+        return None
+    with _cache_lock:
+        entries = _cache.get(dataset_hash, {})
+        if best not in entries:
+            return None
+        message, matched_question = entries[best]
+    # Similar wording is not enough when a year, question number, column or value differs
+    if not _same_specifics(question, matched_question, survey_store.open_table(dataset_hash).column_names):
+        return None
+    with _cache_lock:
+        if best in entries:
+            entries.move_to_end(best)
+    return message, matched_question
+
+
+def store(dataset_hash, question, message):
+    """Remember the answer message (JSON-serializable) given for a question"""
+    if not is_cacheable(question):
+        return
+    text = normalize(question)
+    with _cache_lock:
+        entries = _cache.setdefault(dataset_hash, OrderedDict())
+        _cache.move_to_end(dataset_hash)
+        entries[text] = (dict(message), question)
+        entries.move_to_end(text)
+        while len(entries) > ENTRIES_PER_DATASET:
+            entries.popitem(last=False)
+        while len(_cache) > MAX_DATASETS:
+            _cache.popitem(last=False)
+
+
+def _same_specifics(question, other, columns):
+    """Both questions name the same numbers and columns, and every word has a counterpart in the other"""
+    a, b = normalize(question), normalize(other)
+    if sorted(re.findall(r"\d+(?:\.\d+)?", a)) != sorted(re.findall(r"\d+(?:\.\d+)?", b)):
+        return False
+    if {c for c in columns if survey_profile.mentions_column(question, c)} != {c for c in columns if survey_profile.mentions_column(other, c)}:
+        return False
+    # normalize() already made words singular; the first 4 letters also absorb other endings
+    # ("distributed" / "distribution"), but not "women" vs "men"
+    stems_a = {w[:4] for w in a.split() if len(w) >= 3}
+    stems_b = {w[:4] for w in b.split() if len(w) >= 3}
+    return stems_a == stems_b
+
+
+def _most_similar(text, questions):
+    """Closest cached question by cosine similarity of character n-gram TF-IDF vectors"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    # Refit per lookup: a few hundred short questions take milliseconds, and IDF learned from this
+    # dataset's questions discounts words they all share ("distribution", "show")
+    vectors = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), sublinear_tf=True).fit_transform(questions + [text])
+    scores = (vectors[:-1] @ vectors[-1].T).toarray().ravel()
+    best = int(scores.argmax())
+    return questions[best], float(scores[best])
@@ -0,0 +1,242 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Translator import FileTranslator, SECONDARY_LANG
+
+BATCH_FORMATS = ('.pdf', '.docx', '.xlsx', '.txt')
+DEFAULT_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+REPORT_NAME = "translation_report.json"
+
+
+class RateLimiter:
+    """Token bucket shared by every worker thread: at most `per_minute` requests per minute, with small bursts"""
+
+    def __init__(self, per_minute, burst=None):
+        self.interval = 60.0 / per_minute
+        self.capacity = burst or max(1, per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+def collect_inputs(source, output_dir=None, target_lang=SECONDARY_LANG):
+    """Return [{'input', 'output'}] for a directory (searched recursively) or a manifest file.
+
+    A manifest is either a JSON list of paths / {"input", "output"} objects, or a text file with one path per line.
+    Relative manifest paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        root = source
+        inputs = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for name in sorted(filenames):
+                stem, extension = os.path.splitext(name)
+                if extension.lower() in BATCH_FORMATS and '_translated_' not in stem:
+                    inputs.append({'input': os.path.join(dirpath, name)})
+    else:
+        root = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding='utf-8') as f:
+            if source.lower().endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        inputs = []
+        for entry in entries:
+            item = {'input': entry} if isinstance(entry, str) else dict(entry)
+            item['input'] = os.path.join(root, item['input'])
+            if item.get('output'):
+                item['output'] = os.path.join(root, item['output'])
+            inputs.append(item)
+
+    for item in inputs:
+        if not item.get('output'):
+            item['output'] = output_path_for(item['input'], root, output_dir, target_lang)
+        item['input'] = os.path.abspath(item['input'])
+        item['output'] = os.path.abspath(item['output'])
+    return inputs
+
+
+def output_path_for(input_path, root, output_dir, target_lang):
+    """Next to the input (like translate_file), or at the same relative place under output_dir"""
+    stem, extension = os.path.splitext(input_path)
+    if output_dir is None:
+        return f"{stem}_translated_{target_lang}{extension}"
+    relative = os.path.relpath(os.path.abspath(stem), os.path.abspath(root))
+    return os.path.join(output_dir, f"{relative}_translated_{target_lang}{extension}")
+
+
+def fingerprint(path):
+    """Cheap identity of an input file, so resumed runs redo files that changed since"""
+    st = os.stat(path)
+    return hashlib.sha256(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def load_report(report_path):
+    try:
+        with open(report_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_report(report_path, report):
+    # Atomic replace: an interrupted run always leaves a readable report behind
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, report_path)
+
+
+def translate_one(translator, item, source_lang, target_lang, layout_mode):
+    started = time.perf_counter()
+    record = {
+        'input': item['input'],
+        'output': item['output'],
+        'fingerprint': fingerprint(item['input']),
+        'input_bytes': os.path.getsize(item['input']),
+    }
+    try:
+        os.makedirs(os.path.dirname(item['output']), exist_ok=True)
+        src = item.get('source_lang', source_lang)
+        tgt = item.get('target_lang', target_lang)
+        if item['input'].lower().endswith('.txt'):
+            # Plain text is translated in constant memory instead of being loaded whole
+            translator.translate_text_file_streaming(item['input'], item['output'], src, tgt)
+        else:
+            result = translator.translate_file(item['input'], src, tgt, output_path=item['output'], layout_mode=layout_mode)
+            if not result['success']:
+                raise Exception(result['error'])
+        record['status'] = 'done'
+        record['output_bytes'] = os.path.getsize(item['output'])
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - started, 3)
+    record['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    return record
+
+
+def run_batch(source, output_dir=None, report_path=None, source_lang="English", target_lang=SECONDARY_LANG,
+              workers=DEFAULT_WORKERS, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, resume=True,
+              layout_mode='inplace', translator=None):
+    """Translate every file of a directory or manifest concurrently and return the report dict.
+
+    Results are recorded in the JSON report as each file finishes; with resume, files already done
+    (same input fingerprint, output still present) are skipped.
+    """
+    if report_path is None:
+        report_dir = output_dir or (source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source)))
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, REPORT_NAME)
+    if translator is None:
+        translator = FileTranslator(rate_limiter=RateLimiter(requests_per_minute))
+
+    items = collect_inputs(source, output_dir, target_lang)
+    previous = load_report(report_path) if resume else None
+    files = {}
+    if previous:
+        for record in previous.get('files', []):
+            files[record['input']] = record
+
+    pending = []
+    for item in items:
+        record = files.get(item['input'])
+        if (record and record.get('status') == 'done' and record.get('output') == item['output']
+                and os.path.exists(item['output']) and record.get('fingerprint') == fingerprint(item['input'])):
+            continue
+        pending.append(item)
+
+    report = {
+        'source': os.path.abspath(source),
+        'source_lang': source_lang,
+        'target_lang': target_lang,
+        'started_at': (previous or {}).get('started_at', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        'files': [],
+    }
+
+    def save():
+        report['files'] = [files[item['input']] for item in items if item['input'] in files]
+        report['summary'] = {
+            'total': len(items),
+            'done': sum(1 for r in report['files'] if r['status'] == 'done'),
+            'failed': sum(1 for r in report['files'] if r['status'] == 'failed'),
+            'pending': sum(1 for item in items if files.get(item['input'], {}).get('status') not in ('done', 'failed')),
+            'seconds': round(sum(r.get('seconds', 0) for r in report['files']), 3),
+        }
+        write_report(report_path, report)
+
+    print(f"{len(items)} files, {len(items) - len(pending)} already translated, {len(pending)} to do")
+    for item in pending:
+        # Failed or unfinished files from an earlier run are retried
+        files.pop(item['input'], None)
+    save()
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(translate_one, translator, item, source_lang, target_lang, layout_mode): item for item in pending}
+        for future in as_completed(futures):
+            record = future.result()
+            files[record['input']] = record
+            save()
+            mark = "✓" if record['status'] == 'done' else "✗"
+            print(f"{mark} {record['input']} ({record['seconds']}s){' - ' + record['error'] if record.get('error') else ''}")
+    except KeyboardInterrupt:
+        # Drop queued files; the report already holds everything finished so far
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"Interrupted. Run again with the same arguments to resume. Report: {report_path}")
+        raise
+    executor.shutdown()
+    report['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    save()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a directory or manifest of files without the UI")
+    parser.add_argument('source', help="Directory to translate recursively, or a manifest (.json list or one path per line)")
+    parser.add_argument('--output-dir', default=None, help="Mirror outputs into this tree instead of writing them next to the inputs")
+    parser.add_argument('--report', default=None, help=f"JSON report path (default: {REPORT_NAME} in the output directory)")
+    parser.add_argument('--source-lang', default="English")
+    parser.add_argument('--target-lang', default=SECONDARY_LANG)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Files translated concurrently")
+    parser.add_argument('--rpm', type=int, default=DEFAULT_REQUESTS_PER_MINUTE, help="Global limit on Gemini requests per minute")
+    parser.add_argument('--layout-mode', choices=['inplace', 'html'], default='inplace', help="PDF output mode")
+    parser.add_argument('--no-resume', action='store_true', help="Translate everything again, ignoring the existing report")
+    args = parser.parse_args()
+
+    try:
+        report = run_batch(
+            args.source, output_dir=args.output_dir, report_path=args.report,
+            source_lang=args.source_lang, target_lang=args.target_lang,
+            workers=args.workers, requests_per_minute=args.rpm,
+            resume=not args.no_resume, layout_mode=args.layout_mode,
+        )
+    except KeyboardInterrupt:
+        sys.exit(130)
+    summary = report['summary']
+    print(f"Done: {summary['done']}/{summary['total']} translated, {summary['failed']} failed")
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pdf_engines import PDF_ENGINES, iter_page_blocks, iter_page_text, resolve_pdf_engine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def generate_corpus(corpus_dir, num_docs=5, pages_per_doc=20):
+    """Write synthetic text-layer PDFs with headings and body paragraphs using reportlab"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    paths = []
+    width, height = A4
+    for doc_num in range(num_docs):
+        path = os.path.join(corpus_dir, f"corpus_{doc_num + 1}.pdf")
+        c = canvas.Canvas(path, pagesize=A4)
+        for page_num in range(pages_per_doc):
+            y = height - 60
+            c.setFont("Helvetica-Bold", 18)
+            c.drawString(50, y, f"Section {page_num + 1}: Maintenance schedule")
+            y -= 30
+            while y > 60:
+                c.setFont("Helvetica-Bold", 13)
+                c.drawString(50, y, f"{page_num + 1}.{int(y)} Inspection item")
+                y -= 18
+                c.setFont("Helvetica", 10)
+                for line_num in range(5):
+                    c.drawString(50, y, f"Check the chain slack and adjust it to 20-30 mm, line {line_num + 1} of this paragraph.")
+                    y -= 13
+                y -= 10
+            c.showPage()
+        c.save()
+        paths.append(path)
+    return paths
+
+
+def _run_engine(engine, mode, paths, queue):
+    """Extract every corpus file with one engine in a fresh process and report time and memory"""
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    pages = 0
+    for path in paths:
+        if mode == 'blocks':
+            for _ in iter_page_blocks(path, engine):
+                pages += 1
+        else:
+            for _ in iter_page_text(path, engine):
+                pages += 1
+    elapsed = time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == 'darwin' else 1024
+    queue.put({
+        'engine': engine,
+        'mode': mode,
+        'pages': pages,
+        'seconds': elapsed,
+        'pages_per_second': pages / elapsed if elapsed else float('inf'),
+        'peak_rss_growth_mb': (rss_after - rss_before) * rss_scale / (1024 * 1024),
+        'python_peak_mb': python_peak / (1024 * 1024),
+    })
+
+
+def benchmark(paths, engines=None, modes=('text', 'blocks')):
+    """Benchmark each engine and mode in its own process so peak memory is measured separately"""
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for engine in engines or PDF_ENGINES:
+        if resolve_pdf_engine(engine) != engine:
+            print(f"Skipping {engine}: not installed")
+            continue
+        for mode in modes:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_engine, args=(engine, mode, paths, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF extraction engines on a generated corpus")
+    parser.add_argument('--docs', type=int, default=5, help="Number of generated PDFs")
+    parser.add_argument('--pages', type=int, default=20, help="Pages per generated PDF")
+    parser.add_argument('--corpus-dir', default=None, help="Reuse or create the corpus in this directory")
+    parser.add_argument('--engines', nargs='+', choices=PDF_ENGINES, default=PDF_ENGINES)
+    args = parser.parse_args()
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="pdf_corpus_")
+    paths = generate_corpus(corpus_dir, args.docs, args.pages)
+    print(f"Corpus: {len(paths)} files x {args.pages} pages in {corpus_dir}\n")
+
+    print(f"{'engine':<12}{'mode':<8}{'pages':>7}{'seconds':>10}{'pages/s':>10}{'RSS +MB':>10}{'py peak MB':>12}")
+    for r in benchmark(paths, args.engines):
+        print(f"{r['engine']:<12}{r['mode']:<8}{r['pages']:>7}{r['seconds']:>10.2f}{r['pages_per_second']:>10.1f}"
+              f"{r['peak_rss_growth_mb']:>10.1f}{r['python_peak_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from document_splitter import split_document, merge_documents
+from download_watcher import wait_for_download
+
+# Google Docs translation page; point this at google_docs_standin.html (file://...) to test locally
+TRANSLATE_URL = os.getenv("GOOGLE_DOCS_TRANSLATE_URL", 'https://translate.google.com/?sl=en&tl=hi&op=docs')
+STANDIN_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "google_docs_standin.html")
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+MAX_USES = int(os.getenv("BROWSER_MAX_USES", "20"))
+CHECKOUT_TIMEOUT = int(os.getenv("BROWSER_CHECKOUT_TIMEOUT", "120"))
+PART_RETRIES = int(os.getenv("GOOGLE_DOCS_PART_RETRIES", "2"))
+# Translation wait per part: a base plus time proportional to the part size
+BASE_TIMEOUT = 60
+SECONDS_PER_MB = 30
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+
+
+def start_browser():
+    """Launch a headless Chrome set up for unattended Google Docs translation"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')  # Try with this commented out!
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    prefs = {
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+    chrome_options.add_experimental_option("prefs", prefs)
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": """
+            Object.defineProperty(navigator, 'webdriver', {get: () => undefined})
+        """
+    })
+    return driver
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """Pre-started, health-checked Chrome sessions shared across requests.
+
+    At most `size` sessions are checked out at once; a session is recycled after `max_uses`
+    requests or as soon as a request using it fails.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, factory=start_browser, prewarm=True):
+        self.size = size
+        self.max_uses = max_uses
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+        if prewarm:
+            threading.Thread(target=self._prewarm, name="browser-prewarm", daemon=True).start()
+
+    def _prewarm(self):
+        for _ in range(self.size):
+            try:
+                self._idle.put(BrowserSession(self.factory()))
+            except Exception as e:
+                print(f"Could not pre-start browser: {str(e)}")
+                return
+
+    @contextmanager
+    def session(self, timeout=CHECKOUT_TIMEOUT):
+        """Check out a healthy browser for one request"""
+        if not self._slots.acquire(timeout=timeout):
+            raise Exception("All browser sessions are busy. Please try again shortly.")
+        session = None
+        healthy = False
+        try:
+            session = self._checkout()
+            yield session.driver
+            healthy = True
+        finally:
+            if session is not None:
+                session.uses += 1
+                if healthy and not self._closed and session.uses < self.max_uses and self._reset(session):
+                    self._idle.put(session)
+                else:
+                    self._quit(session)
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return BrowserSession(self.factory())
+            if self._is_healthy(session):
+                return session
+            self._quit(session)
+
+    def _is_healthy(self, session):
+        try:
+            return session.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _reset(self, session):
+        # Leave the page so the next request starts from a clean state
+        try:
+            session.driver.get("about:blank")
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, session):
+        try:
+            session.driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+def translate_document(driver, input_path, download_dir, url=TRANSLATE_URL, timeout=60):
+    """Upload input_path on the Docs translation page and return the path of the downloaded translation"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    # Sessions are reused, so the download directory is set per request
+    driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": download_dir})
+    driver.get(url)
+    # Wait for the file input to appear
+    upload_input = WebDriverWait(driver, 20).until(
+        EC.presence_of_element_located((By.XPATH, '//input[@type="file"]'))
+    )
+    upload_input.send_keys(input_path)
+    # Wait for the "Translate" button to be clickable
+    translate_btn = WebDriverWait(driver, 20).until(
+        EC.element_to_be_clickable((By.XPATH, '//button[contains(., "Translate")]'))
+    )
+    translate_btn.click()
+    # Wait for translation to finish (look for download button)
+    download_btn = WebDriverWait(driver, timeout).until(
+        EC.element_to_be_clickable((By.XPATH, '//button[.//span[contains(text(), "Download translation")]]'))
+    )
+    download_btn.click()
+    # Resolves as soon as the browser closes/renames the finished file
+    downloaded_file = wait_for_download(download_dir, timeout=timeout)
+    if not downloaded_file:
+        raise Exception("Downloaded file not found. Translation may have failed.")
+    return downloaded_file
+
+
+def part_timeout(path):
+    return BASE_TIMEOUT + SECONDS_PER_MB * os.path.getsize(path) / (1024 * 1024)
+
+
+def translate_in_parts(pool, input_path, work_dir, url=TRANSLATE_URL, retries=PART_RETRIES, progress_callback=None):
+    """Translate a document of any size and return the path of the merged translation.
+
+    The input is split into parts within the Docs limits; parts are translated concurrently on
+    separate pooled browser sessions, each retried on its own, and the results are merged in order.
+    """
+    parts_dir = os.path.join(work_dir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    parts = split_document(input_path, parts_dir)
+    done_count = [0]
+    done_lock = threading.Lock()
+
+    def translate_part(index, part_path):
+        last_error = None
+        for attempt in range(retries + 1):
+            # Fresh download directory per attempt so a late file from a failed try is never picked up
+            download_dir = os.path.join(work_dir, "downloads", f"part{index:05d}_try{attempt}")
+            os.makedirs(download_dir)
+            try:
+                with pool.session() as driver:
+                    result = translate_document(driver, part_path, download_dir, url, timeout=part_timeout(part_path))
+                break
+            except Exception as e:
+                last_error = e
+                print(f"Part {index + 1}/{len(parts)} failed (attempt {attempt + 1}): {str(e)}")
+        else:
+            raise Exception(f"Part {index + 1} of {len(parts)} could not be translated: {str(last_error)}")
+        with done_lock:
+            done_count[0] += 1
+            if progress_callback:
+                progress_callback(done_count[0], len(parts))
+        return result
+
+    if len(parts) == 1:
+        translated = [translate_part(0, parts[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(pool.size, len(parts))) as executor:
+            translated = list(executor.map(translate_part, range(len(parts)), parts))
+
+    output_path = os.path.join(work_dir, "translated" + os.path.splitext(input_path)[1].lower())
+    return merge_documents(translated, output_path)
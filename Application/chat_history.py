@@ -0,0 +1,57 @@
+import json
+import os
+
+import workspace
+
+# Messages kept in session memory; older ones are appended to a per-session file on disk
+MAX_IN_MEMORY = int(os.getenv("ANALYZER_HISTORY_MESSAGES", "30"))
+
+
+class ChatHistory:
+    """Chat messages (JSON-serializable dicts) with only the most recent ones held in memory"""
+
+    def __init__(self, max_in_memory=MAX_IN_MEMORY):
+        self.max_in_memory = max_in_memory
+        self.recent = []
+        self.spilled = 0
+        self._path = None
+
+    def append(self, message):
+        self.recent.append(message)
+        if len(self.recent) > self.max_in_memory:
+            overflow = self.recent[:-self.max_in_memory]
+            self.recent = self.recent[-self.max_in_memory:]
+            self._spill(overflow)
+
+    def _spill(self, messages):
+        if self._path is None:
+            # Removed by close(); if the session is abandoned, swept once it has seen no writes for hours
+            self._path = os.path.join(workspace.create("analyzer_history"), "history.jsonl")
+        with open(self._path, "a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(message, ensure_ascii=False) + "\n")
+        self.spilled += len(messages)
+
+    def older(self):
+        """Spilled messages, oldest first, read back from disk"""
+        if self._path is None:
+            return []
+        try:
+            with open(self._path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def close(self):
+        """Forget all messages and remove the spill file's workspace"""
+        if self._path is not None:
+            workspace.remove(os.path.dirname(self._path))
+            self._path = None
+        self.recent = []
+        self.spilled = 0
+
+    def last(self, count):
+        return self.recent[-count:]
+
+    def __len__(self):
+        return self.spilled + len(self.recent)
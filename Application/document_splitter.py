@@ -0,0 +1,344 @@
+import copy
+import math
+import os
+import posixpath
+import zipfile
+
+# Google Docs translation limits (with some headroom)
+MAX_PART_BYTES = int(os.getenv("GOOGLE_DOCS_MAX_MB", "9")) * 1024 * 1024
+MAX_PDF_PAGES = int(os.getenv("GOOGLE_DOCS_MAX_PAGES", "300"))
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+IMAGE_REL_TYPE = R_NS + "/image"
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS = "word/_rels/document.xml.rels"
+
+
+def split_document(input_path, out_dir, max_bytes=MAX_PART_BYTES, max_pages=MAX_PDF_PAGES):
+    """Split a document into parts that fit the Google Docs limits; returns the part paths in order.
+
+    Documents already within the limits are returned as a single part (the input itself).
+    """
+    extension = os.path.splitext(input_path)[1].lower()
+    if extension == '.pdf':
+        return split_pdf(input_path, out_dir, max_bytes, max_pages)
+    if extension == '.docx':
+        return split_docx(input_path, out_dir, max_bytes)
+    if extension == '.txt':
+        return split_txt(input_path, out_dir, max_bytes)
+    # HTML cannot be cut safely without breaking its structure
+    return [input_path]
+
+
+def merge_documents(part_paths, output_path):
+    """Merge translated parts back into one file of the same type, in order"""
+    if len(part_paths) == 1:
+        with open(part_paths[0], 'rb') as src, open(output_path, 'wb') as dst:
+            dst.write(src.read())
+        return output_path
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == '.pdf':
+        merge_pdf(part_paths, output_path)
+    elif extension == '.docx':
+        merge_docx(part_paths, output_path)
+    elif extension == '.txt':
+        with open(output_path, 'wb') as dst:
+            for path in part_paths:
+                with open(path, 'rb') as src:
+                    dst.write(src.read())
+    else:
+        raise Exception(f"Cannot merge {extension} parts")
+    return output_path
+
+
+# --- PDF ---
+
+def split_pdf(input_path, out_dir, max_bytes=MAX_PART_BYTES, max_pages=MAX_PDF_PAGES):
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(input_path)
+    total_pages = len(reader.pages)
+    total_bytes = os.path.getsize(input_path)
+    num_parts = max(math.ceil(total_pages / max_pages), math.ceil(total_bytes / max_bytes), 1)
+    if num_parts == 1:
+        return [input_path]
+    pages_per_part = math.ceil(total_pages / num_parts)
+    ranges = [(start, min(start + pages_per_part, total_pages)) for start in range(0, total_pages, pages_per_part)]
+    return _write_pdf_ranges(reader, ranges, input_path, out_dir, max_bytes)
+
+
+def _write_pdf_ranges(reader, ranges, input_path, out_dir, max_bytes):
+    from PyPDF2 import PdfWriter
+
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    parts = []
+    for start, end in ranges:
+        writer = PdfWriter()
+        for page_num in range(start, end):
+            writer.add_page(reader.pages[page_num])
+        path = os.path.join(out_dir, f"{base}_part{start + 1:05d}-{end:05d}.pdf")
+        with open(path, 'wb') as f:
+            writer.write(f)
+        if os.path.getsize(path) > max_bytes and end - start > 1:
+            # Pages with heavy images: halve this range until each half fits
+            os.unlink(path)
+            middle = (start + end) // 2
+            parts.extend(_write_pdf_ranges(reader, [(start, middle), (middle, end)], input_path, out_dir, max_bytes))
+        else:
+            parts.append(path)
+    return parts
+
+
+def merge_pdf(part_paths, output_path):
+    from PyPDF2 import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for path in part_paths:
+        for page in PdfReader(path).pages:
+            writer.add_page(page)
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+# --- TXT ---
+
+def split_txt(input_path, out_dir, max_bytes=MAX_PART_BYTES):
+    if os.path.getsize(input_path) <= max_bytes:
+        return [input_path]
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    parts = []
+    out = None
+    written = 0
+    with open(input_path, 'rb') as src:
+        for line in src:
+            if out is None or (written and written + len(line) > max_bytes):
+                if out is not None:
+                    out.close()
+                path = os.path.join(out_dir, f"{base}_part{len(parts) + 1:05d}.txt")
+                parts.append(path)
+                out = open(path, 'wb')
+                written = 0
+            out.write(line)
+            written += len(line)
+    if out is not None:
+        out.close()
+    return parts
+
+
+# --- DOCX ---
+
+def split_docx(input_path, out_dir, max_bytes=MAX_PART_BYTES):
+    """Split the body of a Word document into consecutive runs of paragraphs/tables, one package per part.
+
+    Each part keeps styles, numbering and the final section properties, and only the images its
+    own content references.
+    """
+    from lxml import etree
+
+    if os.path.getsize(input_path) <= max_bytes:
+        return [input_path]
+
+    with zipfile.ZipFile(input_path) as archive:
+        entries = {info.filename: archive.read(info.filename) for info in archive.infolist()}
+
+    root = etree.fromstring(entries[DOCUMENT_PART])
+    body = root.find(f"{{{W_NS}}}body")
+    children = list(body)
+    sect_pr = children.pop() if children and children[-1].tag == f"{{{W_NS}}}sectPr" else None
+
+    # Balance parts by the compressed size of their content and images
+    image_sizes = _image_sizes(entries)
+    weights = [len(etree.tostring(child)) // 4 + sum(image_sizes.get(rid, 0) for rid in _referenced_ids(child)) for child in children]
+    for child in children:
+        body.remove(child)
+    if sect_pr is not None:
+        body.remove(sect_pr)
+
+    # Styles, numbering, etc. are repeated in every part: measure them with an empty body
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    empty_path = os.path.join(out_dir, f"{base}_empty.docx")
+    _write_docx_part(root, body, sect_pr, [], entries, empty_path)
+    shared = os.path.getsize(empty_path)
+    os.unlink(empty_path)
+    if shared >= max_bytes:
+        raise Exception(f"The styles and other shared parts of {os.path.basename(input_path)} alone are larger than {max_bytes} bytes, so it cannot be split.")
+    budget = max_bytes - shared
+    groups = []
+    current, current_weight = [], 0
+    for child, weight in zip(children, weights):
+        if current and current_weight + weight > budget:
+            groups.append(current)
+            current, current_weight = [], 0
+        current.append(child)
+        current_weight += weight
+    if current:
+        groups.append(current)
+    if len(groups) <= 1:
+        return [input_path]
+
+    parts = []
+
+    def write_group(group):
+        path = os.path.join(out_dir, f"{base}_part{len(parts) + 1:05d}.docx")
+        _write_docx_part(root, body, sect_pr, group, entries, path)
+        if os.path.getsize(path) <= max_bytes:
+            parts.append(path)
+            return
+        # The size estimate was off (e.g. poorly compressible content): halve the group
+        os.unlink(path)
+        if len(group) == 1:
+            raise Exception(f"A single paragraph or table of {os.path.basename(input_path)} is larger than {max_bytes} bytes and cannot be split further.")
+        middle = len(group) // 2
+        write_group(group[:middle])
+        write_group(group[middle:])
+
+    for group in groups:
+        write_group(group)
+    return parts
+
+
+def _write_docx_part(root, body, sect_pr, group, entries, path):
+    """Write a package whose body is the given children, restoring the shared tree afterwards"""
+    from lxml import etree
+
+    for child in group:
+        body.append(child)
+    if sect_pr is not None:
+        body.append(sect_pr)
+    document_xml = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    kept_ids = set()
+    for child in group:
+        kept_ids |= _referenced_ids(child)
+    if sect_pr is not None:
+        kept_ids |= _referenced_ids(sect_pr)
+    part_entries = _drop_unused_images(entries, kept_ids)
+    part_entries[DOCUMENT_PART] = document_xml
+    _write_package(path, part_entries)
+    for child in group:
+        body.remove(child)
+    if sect_pr is not None:
+        body.remove(sect_pr)
+
+
+def merge_docx(part_paths, output_path):
+    """Append the body content of every part to the first one, carrying over the images each part uses"""
+    from lxml import etree
+
+    with zipfile.ZipFile(part_paths[0]) as archive:
+        entries = {info.filename: archive.read(info.filename) for info in archive.infolist()}
+    root = etree.fromstring(entries[DOCUMENT_PART])
+    body = root.find(f"{{{W_NS}}}body")
+    sect_pr = body[-1] if len(body) and body[-1].tag == f"{{{W_NS}}}sectPr" else None
+    rels_root = etree.fromstring(entries[DOCUMENT_RELS])
+    used_ids = {rel.get('Id') for rel in rels_root}
+    content_types = etree.fromstring(entries['[Content_Types].xml'])
+
+    for part_num, path in enumerate(part_paths[1:], start=2):
+        with zipfile.ZipFile(path) as archive:
+            part_entries = {info.filename: archive.read(info.filename) for info in archive.infolist()}
+        part_root = etree.fromstring(part_entries[DOCUMENT_PART])
+        part_body = part_root.find(f"{{{W_NS}}}body")
+        part_rels = {rel.get('Id'): rel for rel in etree.fromstring(part_entries[DOCUMENT_RELS])}
+        _merge_default_content_types(content_types, etree.fromstring(part_entries['[Content_Types].xml']))
+
+        id_map = {}
+        for child in list(part_body):
+            if child.tag == f"{{{W_NS}}}sectPr":
+                continue
+            for element in child.iter():
+                for attr, value in element.attrib.items():
+                    if not attr.startswith(f"{{{R_NS}}}") or value not in part_rels:
+                        continue
+                    if value not in id_map:
+                        id_map[value] = _copy_relationship(part_rels[value], part_entries, entries, rels_root, used_ids, part_num)
+                    element.set(attr, id_map[value])
+            if sect_pr is not None:
+                sect_pr.addprevious(child)
+            else:
+                body.append(child)
+
+    entries[DOCUMENT_PART] = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    entries[DOCUMENT_RELS] = etree.tostring(rels_root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    entries['[Content_Types].xml'] = etree.tostring(content_types, xml_declaration=True, encoding='UTF-8', standalone=True)
+    _write_package(output_path, entries)
+
+
+def _copy_relationship(rel, part_entries, entries, rels_root, used_ids, part_num):
+    """Add a copy of a part's relationship (and its target file) to the merged package; returns the new id"""
+    new_rel = copy.deepcopy(rel)
+    new_id = f"rIdPart{part_num}_{rel.get('Id')}"
+    while new_id in used_ids:
+        new_id += "_"
+    new_rel.set('Id', new_id)
+    used_ids.add(new_id)
+    if rel.get('TargetMode') != 'External':
+        source_name = posixpath.normpath(posixpath.join("word", rel.get('Target')))
+        if source_name in part_entries:
+            directory, filename = posixpath.split(rel.get('Target'))
+            new_target = posixpath.join(directory, f"part{part_num}_{filename}")
+            entries[posixpath.normpath(posixpath.join("word", new_target))] = part_entries[source_name]
+            new_rel.set('Target', new_target)
+    rels_root.append(new_rel)
+    return new_id
+
+
+def _merge_default_content_types(content_types, part_content_types):
+    known = {d.get('Extension', '').lower() for d in content_types if d.tag == f"{{{CT_NS}}}Default"}
+    for default in part_content_types:
+        if default.tag == f"{{{CT_NS}}}Default" and default.get('Extension', '').lower() not in known:
+            content_types.insert(0, copy.deepcopy(default))
+
+
+def _referenced_ids(element):
+    ids = set()
+    for node in element.iter():
+        for attr, value in node.attrib.items():
+            if attr.startswith(f"{{{R_NS}}}"):
+                ids.add(value)
+    return ids
+
+
+def _image_relationships(entries):
+    from lxml import etree
+    rels = etree.fromstring(entries[DOCUMENT_RELS])
+    return {
+        rel.get('Id'): posixpath.normpath(posixpath.join("word", rel.get('Target')))
+        for rel in rels
+        if rel.get('Type') == IMAGE_REL_TYPE and rel.get('TargetMode') != 'External'
+    }
+
+
+def _image_targets(entries):
+    return set(_image_relationships(entries).values())
+
+
+def _image_sizes(entries):
+    return {rid: len(entries.get(target, b"")) for rid, target in _image_relationships(entries).items()}
+
+
+def _drop_unused_images(entries, kept_ids):
+    """Copy of the package entries without the images (and their relationships) that kept_ids do not use"""
+    from lxml import etree
+
+    rels = etree.fromstring(entries[DOCUMENT_RELS])
+    images = _image_relationships(entries)
+    needed_targets = {images[rid] for rid in kept_ids if rid in images}
+    for rel in list(rels):
+        if rel.get('Id') in images and rel.get('Id') not in kept_ids:
+            rels.remove(rel)
+    part_entries = {
+        name: data for name, data in entries.items()
+        if name not in images.values() or name in needed_targets
+    }
+    part_entries[DOCUMENT_RELS] = etree.tostring(rels, xml_declaration=True, encoding='UTF-8', standalone=True)
+    return part_entries
+
+
+def _write_package(path, entries):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        # [Content_Types].xml first, as Office expects
+        for name in sorted(entries, key=lambda n: n != '[Content_Types].xml'):
+            archive.writestr(name, entries[name])
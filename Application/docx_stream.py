@@ -0,0 +1,69 @@
+import zipfile
+import xml.etree.ElementTree as ET
+
+# WordprocessingML namespace used by word/document.xml
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+DOCUMENT_PART = "word/document.xml"
+
+
+def iter_docx_text(docx_path, progress_callback=None, should_stop=None):
+    """Stream (kind, text) pairs from a .docx without building the full document model.
+
+    kind is 'paragraph' for body paragraphs and 'cell' for paragraphs inside table cells.
+    progress_callback(fraction) is called after each yielded item with the share of
+    word/document.xml parsed so far. Iteration ends early when should_stop() returns True.
+    """
+    try:
+        with zipfile.ZipFile(docx_path) as archive:
+            info = archive.getinfo(DOCUMENT_PART)
+            total_size = info.file_size or 1
+            with archive.open(info) as xml_file:
+                stack = []
+                cell_depth = 0
+                for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+                    if event == "start":
+                        stack.append(elem)
+                        if elem.tag == W_NS + "tc":
+                            cell_depth += 1
+                        continue
+
+                    stack.pop()
+                    tag = elem.tag
+                    if tag == W_NS + "tc":
+                        cell_depth -= 1
+                    elif tag == W_NS + "p":
+                        text = _paragraph_text(elem)
+                        elem.clear()
+                        yield ("cell" if cell_depth else "paragraph", text)
+                        if progress_callback:
+                            progress_callback(min(xml_file.tell() / total_size, 1.0))
+                        if should_stop and should_stop():
+                            return
+
+                    # Drop finished top-level body children so memory stays flat
+                    if len(stack) == 2 and stack[-1].tag == W_NS + "body":
+                        stack[-1].remove(elem)
+
+                if progress_callback:
+                    progress_callback(1.0)
+    except KeyError:
+        raise Exception(f"Not a Word document (missing {DOCUMENT_PART}): {docx_path}")
+    except (zipfile.BadZipFile, ET.ParseError) as e:
+        raise Exception(f"Error streaming Word document: {str(e)}")
+
+
+def _paragraph_text(paragraph):
+    """Collect the visible text of a w:p element, keeping tabs and line breaks"""
+    parts = []
+    # Only look inside runs: w:pPr also contains w:tab elements (tab stops)
+    for run in paragraph.iter(W_NS + "r"):
+        for node in run:
+            tag = node.tag
+            if tag == W_NS + "t":
+                parts.append(node.text or "")
+            elif tag == W_NS + "tab":
+                parts.append("\t")
+            elif tag in (W_NS + "br", W_NS + "cr"):
+                parts.append("\n")
+    return "".join(parts)
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+# In-progress download names used by Chrome, Firefox and Safari
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.download', '.tmp')
+
+_observer = None
+_observer_lock = threading.Lock()
+
+
+def find_completed_download(download_dir):
+    """Return the newest finished download in download_dir, or None"""
+    try:
+        entries = list(os.scandir(download_dir))
+    except FileNotFoundError:
+        return None
+    names = {entry.name for entry in entries}
+    finished = [entry for entry in entries if entry.is_file() and _is_complete(entry.path, names)]
+    if not finished:
+        return None
+    return max(finished, key=lambda entry: entry.stat().st_mtime).path
+
+
+def _is_complete(path, sibling_names=None):
+    name = os.path.basename(path)
+    # Hidden files are browser scratch files (e.g. .com.google.Chrome.XXXXXX)
+    if name.startswith('.') or name.endswith(PARTIAL_SUFFIXES):
+        return False
+    if sibling_names is None:
+        sibling_names = set(os.listdir(os.path.dirname(path)))
+    # Firefox creates the final name up front and writes into name.part
+    if any(name + suffix in sibling_names for suffix in PARTIAL_SUFFIXES):
+        return False
+    try:
+        return os.path.getsize(path) > 0
+    except FileNotFoundError:
+        return False
+
+
+def _get_observer():
+    """One shared watchdog observer thread for every download being watched in this process"""
+    global _observer
+    with _observer_lock:
+        if _observer is None:
+            from watchdog.observers import Observer
+            observer = Observer()
+            observer.daemon = True
+            observer.start()
+            _observer = observer
+        return _observer
+
+
+def wait_for_download(download_dir, timeout=60, poll_interval=0.5):
+    """Block until a finished file lands in download_dir and return its path.
+
+    Filesystem notifications (a file closed after writing, or renamed from .crdownload to its final
+    name) resolve the wait immediately; a poll every poll_interval seconds covers missed events and
+    platforms where watchdog is unavailable. Each call watches only its own directory, so concurrent
+    downloads into separate directories do not interfere.
+    """
+    done = threading.Event()
+    found = []
+
+    def consider(path):
+        if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(download_dir) and _is_complete(path):
+            found.append(path)
+            done.set()
+
+    watch = None
+    observer = None
+    try:
+        from watchdog.events import FileSystemEventHandler
+
+        class DownloadHandler(FileSystemEventHandler):
+            def on_moved(self, event):
+                if not event.is_directory:
+                    consider(event.dest_path)
+
+            def on_closed(self, event):
+                if not event.is_directory:
+                    consider(event.src_path)
+
+            def on_created(self, event):
+                if not event.is_directory:
+                    consider(event.src_path)
+
+        observer = _get_observer()
+        watch = observer.schedule(DownloadHandler(), download_dir, recursive=False)
+    except Exception as e:
+        # No watchdog (or no inotify/FSEvents): polling alone still works
+        print(f"Download watcher falling back to polling: {str(e)}")
+
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            # Check the directory first: the file may have landed before the watch was set up
+            path = find_completed_download(download_dir)
+            if path:
+                return path
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if done.wait(min(poll_interval, remaining)) and found:
+                return found[-1]
+    finally:
+        if watch is not None:
+            try:
+                observer.unschedule(watch)
+            except Exception:
+                pass
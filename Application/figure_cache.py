@@ -0,0 +1,52 @@
+import hashlib
+import io
+import json
+import os
+import threading
+
+import survey_store
+
+FIGURE_DPI = 110
+
+
+def figure_key(*source):
+    """Key for what produced a figure: generated code, a query, or an operation and its params"""
+    raw = json.dumps(source, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def figure_path(dataset_hash, key):
+    # A <hash>.<suffix> sidecar, so the figure is removed when its dataset is evicted
+    return os.path.join(survey_store.STORE_DIR, f"{dataset_hash}.fig.{key}.png")
+
+
+def to_png(fig):
+    """Render a matplotlib figure to PNG bytes and close it"""
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format="png", dpi=FIGURE_DPI, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+def get_or_render(dataset_hash, key, render):
+    """Path of the cached PNG for (dataset hash, key), calling render() only on a miss.
+
+    render returns a matplotlib figure or PNG bytes, or None when there is nothing to plot.
+    """
+    path = figure_path(dataset_hash, key)
+    if os.path.exists(path):
+        return path
+    figure = render()
+    if figure is None:
+        return None
+    png = figure if isinstance(figure, bytes) else to_png(figure)
+    os.makedirs(survey_store.STORE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    return path
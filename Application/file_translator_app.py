@@ -1,9 +1,8 @@
 def main():
     import streamlit as st
     import os
-    import tempfile
-    from pathlib import Path
     from Translator import FileTranslator, detect_language, validate_file_format, SECONDARY_LANG
+    import translation_jobs
     import time
 
     # Page configuration
@@ -20,97 +19,67 @@ def main():
 
     translator = get_translator()
 
-    def translate_file(uploaded_file, translation_direction, use_ocr):
-        """Handle file translation"""
-        
-        # Parse translation direction
+    # File translations run in background worker processes shared by all sessions
+    @st.cache_resource
+    def get_job_queue():
+        return translation_jobs.TranslationJobQueue()
+
+    job_queue = get_job_queue()
+
+    # PDF output layout choices -> layout_mode for FileTranslator.save_translated_pdf (None = plain text)
+    PDF_OUTPUT_MODES = {
+        "Original layout (in place)": 'inplace',
+        "Rebuilt layout (HTML)": 'html',
+        "Plain text": None,
+    }
+
+    def parse_direction(translation_direction):
+        """Split 'English → Hindi' into (source_lang, target_lang)"""
         if "→" in translation_direction:
             source_lang, target_lang = translation_direction.split(" → ")
         else:
             source_lang, target_lang = translation_direction.split(" to ")
-        
-        # Create progress bar
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        try:
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_file_path = tmp_file.name
-            
-            # Update progress
-            progress_bar.progress(20)
-            status_text.text("Extracting text from file...")
-            
-            # Extract text
-            original_text = translator.extract_text_from_file(tmp_file_path, use_ocr)
-            
-            if not original_text.strip():
-                st.error("No text content found in the file. Try enabling OCR if it's a scanned PDF.")
-                os.unlink(tmp_file_path)
-                return
-            
-            # Update progress
-            progress_bar.progress(40)
-            status_text.text("Translating text...")
-            
-            # Translate text
-            translated_text = translator.translate_text(original_text, source_lang, target_lang)
-            
-            # Debug: Show translation in the app for troubleshooting
-            st.info("**Debug: Translation Preview (first 500 chars):**\n" + translated_text[:500])
-            
-            # Warn if translation is too similar to original
-            if translated_text.strip() == original_text.strip() or len(set(translated_text.strip())) < 10:
-                st.warning("⚠️ The translation result is very similar to the original. The translation may have failed. Please check your API key, rate limits, or try again with a smaller file.")
-            
-            # Update progress
-            progress_bar.progress(80)
-            status_text.text("Preparing download...")
-            
-            # Generate output filename
-            base_name = Path(uploaded_file.name).stem
-            extension = Path(uploaded_file.name).suffix
-            output_filename = f"{base_name}_translated_{target_lang}{extension}"
-            
-            # Save translated file
-            output_path = os.path.join(tempfile.gettempdir(), output_filename)
-            translator.save_translated_file(tmp_file_path, translated_text, output_path)
-            
-            # Update progress
-            progress_bar.progress(100)
-            status_text.text("Translation completed!")
-            
-            # Clean up
-            os.unlink(tmp_file_path)
-            
-            st.success("✅ Translation completed successfully!")
-            
-            return {
-                'success': True,
-                'original_text': original_text,
-                'translated_text': translated_text,
-                'output_path': output_path
-            }
-            
-        except Exception as e:
-            st.error(f"❌ Translation failed: {str(e)}")
-            progress_bar.progress(0)
-            status_text.text("Translation failed")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        return source_lang, target_lang
+
+    def submit_translation_job(uploaded_file, translation_direction, use_ocr, pdf_output_mode=None):
+        """Queue the upload for a background worker and return the job id"""
+        source_lang, target_lang = parse_direction(translation_direction)
+        return job_queue.submit(
+            uploaded_file.name,
+            uploaded_file,
+            source_lang,
+            target_lang,
+            use_ocr=use_ocr,
+            layout_mode=PDF_OUTPUT_MODES.get(pdf_output_mode),
+        )
+
+    @st.fragment(run_every=1)
+    def show_job_progress(job_id):
+        """Poll the job without blocking the page; rerun the app once it has finished"""
+        job = job_queue.status(job_id)
+        if job is None:
+            st.session_state['translation_result'] = {'success': False, 'error': "Translation job not found"}
+            st.rerun()
+        if job['status'] in translation_jobs.FINISHED_STATUSES:
+            if job['status'] == translation_jobs.CANCELLED:
+                st.session_state['translation_result'] = {'success': False, 'error': "Translation was cancelled"}
+            else:
+                st.session_state['translation_result'] = translation_jobs.load_result(job_id)
+            st.rerun()
+        # ETA from measured throughput of earlier jobs and the pace of this one
+        eta = job.get('eta_seconds')
+        st.progress(job['progress'], text=f"About {eta // 60}m {eta % 60:02d}s left" if eta is not None else None)
+        st.text(job['message'])
+        if job.get('preview'):
+            # Latest finished batch of a streamed translation
+            st.caption(job['preview'])
+        if st.button("Cancel translation", key=f"cancel_{job_id}"):
+            job_queue.cancel(job_id)
 
     def translate_quick_text(text, translation_direction):
         """Handle quick text translation"""
         
-        # Parse translation direction
-        if "→" in translation_direction:
-            source_lang, target_lang = translation_direction.split(" → ")
-        else:
-            source_lang, target_lang = translation_direction.split(" to ")
+        source_lang, target_lang = parse_direction(translation_direction)
         
         try:
             with st.spinner("Translating text..."):
@@ -164,6 +133,13 @@ def main():
             help="Use OCR to extract text from images in PDF files (slower but more accurate for scanned documents)"
         )
         
+        # Output layout for translated PDFs
+        pdf_output_mode = st.selectbox(
+            "PDF Output Layout",
+            list(PDF_OUTPUT_MODES),
+            help="Keep the original pages and replace text in place, rebuild the layout via HTML, or write plain text pages"
+        )
+        
         # File format info
         st.markdown("---")
         st.markdown("**Supported Formats:**")
@@ -194,13 +170,18 @@ def main():
             st.session_state['uploaded_file'] = None
             st.session_state['uploaded_file_obj'] = uploaded_file
             st.session_state['translation_result'] = None
+            st.session_state['translation_job_id'] = None
         if uploaded_file is not None and st.button("🚀 Translate File", type="primary"):
             st.session_state['uploaded_file'] = uploaded_file
             st.session_state['translation_result'] = None  # Reset previous result
-        if st.session_state.get('uploaded_file') and st.session_state['translation_result'] is None:
-            # Do translation and store result
-            result = translate_file(st.session_state['uploaded_file'], translation_direction, use_ocr)
-            st.session_state['translation_result'] = result
+            try:
+                st.session_state['translation_job_id'] = submit_translation_job(uploaded_file, translation_direction, use_ocr, pdf_output_mode)
+            except Exception as e:
+                # Quota exhaustion (WorkspaceFull) or a pool that could not be restarted
+                st.session_state['translation_result'] = {'success': False, 'error': str(e)}
+        if st.session_state.get('translation_job_id') and st.session_state['translation_result'] is None:
+            # Job runs in a worker process; the fragment polls its progress
+            show_job_progress(st.session_state['translation_job_id'])
         if st.session_state.get('translation_result'):
             result = st.session_state['translation_result']
             if result.get('success'):
@@ -208,6 +189,20 @@ def main():
                 translated_text = result['translated_text']
                 output_path = result['output_path']
                 
+                st.success("✅ Translation completed successfully!")
+                
+                # Warn if the file does not look like the chosen source language
+                detected_lang = result.get('detected_lang')
+                if detected_lang and detected_lang != "Unknown" and detected_lang.lower() != result.get('source_lang', '').lower():
+                    st.warning(f"⚠️ This file looks like {detected_lang}, but it was translated from {result.get('source_lang')}. Check the translation direction.")
+                
+                if result.get('timings'):
+                    st.caption("Stage timings: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in result['timings'].items()))
+                
+                # Warn if translation is too similar to original
+                if translated_text.strip() == original_text.strip() or len(set(translated_text.strip())) < 10:
+                    st.warning("⚠️ The translation result is very similar to the original. The translation may have failed. Please check your API key, rate limits, or try again with a smaller file.")
+                
                 # Create unique widget keys
                 file_suffix = os.path.basename(st.session_state['uploaded_file'].name) if st.session_state.get('uploaded_file') else ""
                 unique_id = str(id(st.session_state['uploaded_file'])) if st.session_state.get('uploaded_file') else str(time.time())
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cache for static instances of variable fonts (reused across processes and restarts)
+FONT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "suzuki_font_cache")
+
+# Output fonts per script. 'sample' is a character the font must cover to be considered valid.
+# Latin (and any other) targets have no entry: the PDF/HTML engines' built-in fonts cover them.
+# FONT_PATH_<SCRIPT> (e.g. FONT_PATH_JAPANESE) points a script at a font file outside the repo.
+FONT_SPECS = {
+    'devanagari': {
+        'family': "Noto Sans Devanagari",
+        'reportlab_name': "NotoSansDevanagariRegular",
+        'docx_name': "Mangal",
+        'path': os.getenv("FONT_PATH_DEVANAGARI", os.path.join(APP_DIR, "Tiro_Devanagari_Hindi", "NotoSansDevanagari-Regular.ttf")),
+        'sample': "क",
+    },
+    'japanese': {
+        'family': "Noto Sans JP",
+        'reportlab_name': "NotoSansJP",
+        'docx_name': "Noto Sans JP",
+        'path': os.getenv("FONT_PATH_JAPANESE", os.path.join(APP_DIR, "Noto_Sans_JP", "NotoSansJP-VariableFont_wght.ttf")),
+        'sample': "あ",
+    },
+}
+
+_lock = threading.Lock()
+_fonts = {}
+_errors = {}
+
+# Fallback fonts when the target language needs no bundled font
+DEFAULT_REPORTLAB_FONT = "Helvetica"
+DEFAULT_CSS_FAMILY = "Arial, sans-serif"
+
+# WeasyPrint: one FontConfiguration for the process, one stylesheet per script
+_font_config = None
+_css = {}
+# FontConfiguration is not thread-safe, so renders sharing it are serialized
+render_lock = threading.Lock()
+
+
+def script_for_language(target_lang):
+    """Map a target language name/code to a FONT_SPECS key, or None when the default fonts cover it"""
+    lang = (target_lang or "").lower()
+    if lang in ('hindi', 'hin', 'hi'):
+        return 'devanagari'
+    if lang in ('japanese', 'jap', 'ja', 'jpn'):
+        return 'japanese'
+    return None
+
+
+def get_font(target_lang):
+    """Return the loaded font entry (family, path, reportlab_name, docx_name) for a target language,
+    or None when the engine's default font should be used"""
+    script = script_for_language(target_lang)
+    if script is None:
+        return None
+    return _get_script_font(script)
+
+
+def warm_up():
+    """Load, validate and register all output fonts once; returns {script: error} for fonts that failed"""
+    for script in FONT_SPECS:
+        try:
+            _get_script_font(script)
+        except Exception:
+            pass
+    return dict(_errors)
+
+
+def _get_script_font(script):
+    if script not in _fonts and script not in _errors:
+        with _lock:
+            if script not in _fonts and script not in _errors:
+                _load_font(script)
+    if script in _errors:
+        raise Exception(_errors[script])
+    return _fonts[script]
+
+
+def _load_font(script):
+    spec = FONT_SPECS[script]
+    path = spec['path']
+    if not os.path.exists(path):
+        _errors[script] = (f"{spec['family']} font file not found: {path}. {script.capitalize()} output needs it; "
+                           f"add the file or set FONT_PATH_{script.upper()} to its location.")
+        print(f"WARNING: {_errors[script]}")
+        return
+    try:
+        path = _static_instance(path)
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        # reportlab embeds only the glyphs that are used (subsetting) for TTFonts
+        tt_font = TTFont(spec['reportlab_name'], path)
+        if ord(spec['sample']) not in tt_font.face.charToGlyph:
+            raise Exception(f"{os.path.basename(path)} does not cover {spec['family']} characters")
+        if spec['reportlab_name'] not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(tt_font)
+        _fonts[script] = dict(spec, path=path)
+    except Exception as e:
+        _errors[script] = f"Could not load font {path}: {str(e)}"
+        print(f"WARNING: {_errors[script]}")
+
+
+def _static_instance(path):
+    """Return a cached default-weight static instance of a variable font, or the path unchanged"""
+    try:
+        from fontTools.ttLib import TTFont as FTFont
+        from fontTools.varLib import instancer
+    except ImportError:
+        return path
+
+    font = FTFont(path, lazy=True)
+    is_variable = 'fvar' in font
+    font.close()
+    if not is_variable:
+        return path
+
+    stat = os.stat(path)
+    cached = os.path.join(FONT_CACHE_DIR, f"{Path(path).stem}-{stat.st_size}-{int(stat.st_mtime)}-static.ttf")
+    if not os.path.exists(cached):
+        os.makedirs(FONT_CACHE_DIR, exist_ok=True)
+        font = FTFont(path)
+        defaults = {axis.axisTag: axis.defaultValue for axis in font['fvar'].axes}
+        static = instancer.instantiateVariableFont(font, defaults)
+        tmp_path = cached + f".{os.getpid()}.tmp"
+        static.save(tmp_path)
+        os.replace(tmp_path, cached)
+    return cached
+
+
+def weasyprint_resources(target_lang):
+    """Return the shared (FontConfiguration, CSS) for rendering HTML in the target language"""
+    global _font_config
+    script = script_for_language(target_lang)
+    if script not in _css:
+        font = get_font(target_lang)
+        with _lock:
+            if script not in _css:
+                from weasyprint import CSS
+                from weasyprint.text.fonts import FontConfiguration
+
+                if _font_config is None:
+                    _font_config = FontConfiguration()
+                font_face = ""
+                family = DEFAULT_CSS_FAMILY
+                if font:
+                    font_face = f"""
+                @font-face {{
+                    font-family: '{font['family']}';
+                    src: url('{Path(font['path']).as_uri()}') format('truetype');
+                }}"""
+                    family = f"'{font['family']}', {DEFAULT_CSS_FAMILY}"
+                css_content = f"""{font_face}
+                body {{
+                    font-family: {family};
+                    margin: 20px;
+                }}
+                .page {{ page-break-after: always; margin-bottom: 20px; }}
+                .text-block {{ margin: 5px 0; }}
+                .paragraph {{ margin: 10px 0; }}
+                """
+                _css[script] = CSS(string=css_content, font_config=_font_config)
+    return _font_config, _css[script]
@@ -0,0 +1,109 @@
+import io
+
+import tracing
+from pdf_layout import assign_size_tiers, blocks_from_words
+
+# Available PDF extraction backends, fastest first
+PDF_ENGINES = ['pymupdf', 'pdfplumber']
+DEFAULT_PDF_ENGINE = 'pymupdf'
+
+
+def resolve_pdf_engine(engine=None):
+    """Return the engine to use, falling back to pdfplumber when PyMuPDF is not installed"""
+    engine = (engine or DEFAULT_PDF_ENGINE).lower()
+    if engine not in PDF_ENGINES:
+        raise Exception(f"Unknown PDF engine: {engine}. Choose from {', '.join(PDF_ENGINES)}")
+    if engine == 'pymupdf':
+        try:
+            import fitz  # noqa: F401
+        except ImportError:
+            return 'pdfplumber'
+    return engine
+
+
+def iter_page_text(pdf_path, engine=None, use_ocr=False):
+    """Yield the plain text of each page, running OCR on pages without a text layer if requested"""
+    engine = resolve_pdf_engine(engine)
+    if engine == 'pymupdf':
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                text = page.get_text("text")
+                if not text.strip() and use_ocr:
+                    with tracing.span('ocr.page', page=page.number + 1, pages=1) as span:
+                        png_bytes = page.get_pixmap(dpi=200).tobytes("png")
+                        text = _ocr_image_bytes(png_bytes)
+                        span.set(bytes=len(png_bytes))
+                yield text
+    else:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text() or ""
+                if not text.strip() and use_ocr:
+                    with tracing.span('ocr.page', page=page.page_number, pages=1):
+                        img = page.to_image()
+                        text = _ocr_image(img.original)
+                yield text
+
+
+def iter_page_blocks(pdf_path, engine=None):
+    """Yield (page_number, page_text, blocks) per page.
+
+    Each block is a dict with 'text', 'size' (dominant font size), 'tier' ('h2', 'h3' or 'p',
+    relative to the page's body size) and 'bbox' (x0, y0, x1, y1).
+    blocks is None when the engine cannot provide block structure for the page.
+    """
+    engine = resolve_pdf_engine(engine)
+    if engine == 'pymupdf':
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            for page_num, page in enumerate(doc):
+                blocks = pymupdf_page_blocks(page)
+                yield page_num, "\n\n".join(b['text'] for b in blocks), blocks
+    else:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_num, page in enumerate(pdf.pages):
+                words = page.extract_words(extra_attrs=["size"])
+                yield page_num, page.extract_text() or "", blocks_from_words(words) or None
+
+
+def pymupdf_page_blocks(page):
+    """Build text blocks with dominant font size and bbox from a PyMuPDF page"""
+    blocks = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type", 0) != 0:
+            # Image block
+            continue
+        lines = []
+        size_weights = {}
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            line_text = "".join(span["text"] for span in spans)
+            if line_text.strip():
+                lines.append(line_text)
+            for span in spans:
+                size = round(span["size"], 1)
+                size_weights[size] = size_weights.get(size, 0) + len(span["text"].strip())
+        text = "\n".join(lines).strip()
+        if not text:
+            continue
+        blocks.append({
+            'text': text,
+            'size': max(size_weights, key=size_weights.get) if size_weights else 12,
+            'bbox': tuple(block["bbox"]),
+        })
+    for block, tier in zip(blocks, assign_size_tiers([b['size'] for b in blocks])):
+        block['tier'] = tier
+    return blocks
+
+
+def _ocr_image_bytes(png_bytes):
+    from PIL import Image
+    return _ocr_image(Image.open(io.BytesIO(png_bytes)))
+
+
+def _ocr_image(image):
+    import pytesseract
+    return pytesseract.image_to_string(image, lang='jpn+eng')
@@ -0,0 +1,58 @@
+import html
+import os
+
+import font_registry
+from pdf_engines import pymupdf_page_blocks
+
+
+def target_font(target_lang):
+    """Return (family, font_path) for the target language, or (None, None) to keep the built-in Latin font"""
+    font = font_registry.get_font(target_lang)
+    if font is None:
+        return None, None
+    return font['family'], font['path']
+
+
+def translate_pdf_in_place(pdf_path, output_path, translate_blocks, target_lang=None):
+    """Replace every text block of the original PDF with its translation, fitted into the block's bbox.
+
+    translate_blocks(list_of_texts) must return the translations in the same order. Images and
+    vector graphics are left untouched; only the original text is removed before writing.
+    """
+    import fitz
+
+    family, font_path = target_font(target_lang)
+    archive = None
+    font_face = ""
+    if font_path:
+        archive = fitz.Archive(os.path.dirname(font_path))
+        font_face = f"@font-face {{font-family: '{family}'; src: url({os.path.basename(font_path)});}}"
+    font_family = f"'{family}', sans-serif" if family else "sans-serif"
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                blocks = pymupdf_page_blocks(page)
+                if not blocks:
+                    continue
+                translations = translate_blocks([block['text'] for block in blocks])
+
+                # Remove only the original text; keep images, drawings and backgrounds
+                for block in blocks:
+                    page.add_redact_annot(block['bbox'], fill=False)
+                page.apply_redactions(
+                    images=fitz.PDF_REDACT_IMAGE_NONE,
+                    graphics=fitz.PDF_REDACT_LINE_ART_NONE,
+                )
+
+                for block, translated in zip(blocks, translations):
+                    css = f"{font_face} * {{font-family: {font_family}; font-size: {block['size']}px; margin: 0;}}"
+                    body = html.escape(translated).replace("\n", "<br>")
+                    # scale_low=0 lets the text shrink as far as needed to stay inside the original bbox
+                    page.insert_htmlbox(fitz.Rect(block['bbox']), body, css=css, archive=archive, scale_low=0)
+
+            # Embed only the glyphs actually used by the inserted translations
+            doc.subset_fonts()
+            doc.save(output_path, garbage=3, deflate=True)
+    except Exception as e:
+        raise Exception(f"Error replacing PDF text in place: {str(e)}")
@@ -0,0 +1,107 @@
+import numpy as np
+
+# Heading tiers relative to the page's body font size
+HEADING_RATIOS = (('h2', 1.4), ('h3', 1.15))
+
+
+def assign_size_tiers(sizes, body_size=None):
+    """Map font sizes to 'h2' / 'h3' / 'p' relative to the body size (the most common size)"""
+    sizes = np.asarray(sizes, dtype=float)
+    if sizes.size == 0:
+        return np.array([], dtype=object)
+    if body_size is None:
+        body_size = _body_size(sizes)
+    conditions = [sizes >= body_size * ratio for _, ratio in HEADING_RATIOS]
+    return np.select(conditions, [tier for tier, _ in HEADING_RATIOS], default='p').astype(object)
+
+
+def blocks_from_words(words, line_tolerance=0.5, block_gap=0.8, size_jump=1.0, column_gap=3.0):
+    """Rebuild text blocks in reading order from word records (pdfplumber extract_words with 'size').
+
+    Words are grouped into lines when their tops are within line_tolerance x median word height,
+    and lines are split into segments wherever the horizontal gap between neighbouring words exceeds
+    column_gap x the median character width (columns, table cells). Each segment joins the block whose
+    last segment sits directly above it: vertical gap within block_gap x line height, font size within
+    size_jump points and overlapping horizontally. Otherwise it starts a new block.
+    Returns dicts with 'text', 'size', 'tier' and 'bbox' (x0, top, x1, bottom).
+    """
+    if not words:
+        return []
+
+    x0 = np.fromiter((w['x0'] for w in words), float, len(words))
+    x1 = np.fromiter((w['x1'] for w in words), float, len(words))
+    top = np.fromiter((w['top'] for w in words), float, len(words))
+    bottom = np.fromiter((w['bottom'] for w in words), float, len(words))
+    size = np.fromiter((w.get('size', bottom_i - top_i) for w, top_i, bottom_i in zip(words, top, bottom)), float, len(words))
+    texts = np.array([w['text'] for w in words], dtype=object)
+
+    # --- Words -> lines: sort by top, start a new line where the top jumps ---
+    height = np.median(bottom - top) or 1.0
+    order = np.argsort(top, kind='stable')
+    new_line = np.empty(len(order), dtype=bool)
+    new_line[0] = True
+    new_line[1:] = np.diff(top[order]) > line_tolerance * height
+    line_id = np.empty(len(order), dtype=np.int64)
+    line_id[order] = np.cumsum(new_line) - 1
+
+    # --- Lines -> segments: left-to-right, split where the gap is several characters wide ---
+    order = np.lexsort((x0, line_id))
+    line_sorted = line_id[order]
+    char_width = np.median((x1 - x0) / np.maximum(np.fromiter((len(t) for t in texts), float, len(texts)), 1.0)) or 1.0
+    new_segment = np.empty(len(order), dtype=bool)
+    new_segment[0] = True
+    new_segment[1:] = (line_sorted[1:] != line_sorted[:-1]) | (x0[order][1:] - x1[order][:-1] > column_gap * char_width)
+    starts = np.flatnonzero(new_segment)
+    counts = np.diff(np.r_[starts, len(order)])
+
+    seg_line = line_sorted[starts]
+    seg_x0 = np.minimum.reduceat(x0[order], starts)
+    seg_x1 = np.maximum.reduceat(x1[order], starts)
+    seg_top = np.minimum.reduceat(top[order], starts)
+    seg_bottom = np.maximum.reduceat(bottom[order], starts)
+    seg_size = np.add.reduceat(size[order], starts) / counts
+    seg_text = [" ".join(chunk) for chunk in np.split(texts[order], starts[1:])]
+    seg_height = np.maximum(seg_bottom - seg_top, 1.0)
+
+    # --- Segments -> blocks: continue the block directly above, else start a new one ---
+    members = []  # segment indices per block, in reading order
+    open_blocks = []  # blocks whose last segment is still close enough to be continued
+    for i in range(len(starts)):
+        # Segments arrive top to bottom, so a block left behind by the gap can never continue
+        open_blocks = [b for b in open_blocks if seg_top[i] - seg_bottom[members[b][-1]] <= block_gap * seg_height[members[b][-1]]]
+        target = None
+        for b in reversed(open_blocks):
+            j = members[b][-1]
+            if (seg_line[j] < seg_line[i]
+                    and abs(seg_size[i] - seg_size[j]) <= size_jump
+                    and seg_x0[i] <= seg_x1[j] and seg_x1[i] >= seg_x0[j]):
+                target = b
+                break
+        if target is None:
+            members.append([i])
+            open_blocks.append(len(members) - 1)
+        else:
+            members[target].append(i)
+
+    block_x0 = np.array([seg_x0[m].min() for m in members])
+    block_x1 = np.array([seg_x1[m].max() for m in members])
+    block_top = np.array([seg_top[m].min() for m in members])
+    block_bottom = np.array([seg_bottom[m].max() for m in members])
+    block_size = np.array([seg_size[m].max() for m in members])
+    tiers = assign_size_tiers(block_size, body_size=_body_size(size))
+
+    blocks = []
+    for i, m in enumerate(members):
+        blocks.append({
+            'text': "\n".join(seg_text[j] for j in m),
+            'size': round(float(block_size[i]), 1),
+            'tier': tiers[i],
+            'bbox': (float(block_x0[i]), float(block_top[i]), float(block_x1[i]), float(block_bottom[i])),
+        })
+    return blocks
+
+
+def _body_size(sizes):
+    """Most common font size, weighted by word count"""
+    values, counts = np.unique(np.round(sizes, 1), return_counts=True)
+    return values[np.argmax(counts)]
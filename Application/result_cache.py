@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+# Finished translations keyed by (content hash, languages, OCR flag, output mode)
+RESULTS_DIR = os.path.join(tempfile.gettempdir(), "suzuki_translation_results")
+MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_ENTRIES", "200"))
+MAX_BYTES = int(os.getenv("TRANSLATION_CACHE_MB", "2048")) * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def copy_and_hash(src_file, dest_path):
+    """Copy a file-like object to dest_path in chunks, returning its SHA-256 hex digest"""
+    digest = hashlib.sha256()
+    if hasattr(src_file, "seek"):
+        src_file.seek(0)
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = src_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def result_key(content_hash, source_lang, target_lang, use_ocr, layout_mode):
+    """Cache key for one translation request"""
+    raw = json.dumps([content_hash, source_lang, target_lang, bool(use_ocr), layout_mode])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """Return the cache entry directory for key (refreshing its LRU time), or None"""
+    entry = os.path.join(RESULTS_DIR, key)
+    meta_path = os.path.join(entry, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        os.utime(meta_path)
+    except FileNotFoundError:
+        # Evicted between the check and the touch
+        return None
+    return entry
+
+
+def put(key, files):
+    """Store {name_in_entry: source_path} under key and evict least recently used entries"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    entry = os.path.join(RESULTS_DIR, key)
+    if os.path.exists(entry):
+        return entry
+    tmp_entry = os.path.join(RESULTS_DIR, f".{key}.{uuid.uuid4().hex}.tmp")
+    os.makedirs(tmp_entry)
+    for name, src in files.items():
+        _link_or_copy(src, os.path.join(tmp_entry, name))
+    with open(os.path.join(tmp_entry, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({'key': key, 'files': sorted(files), 'created_at': time.time()}, f)
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # Another worker stored the same result first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    evict()
+    return entry
+
+
+def restore(entry, name, dest_path):
+    """Materialize one file of a cache entry at dest_path"""
+    _link_or_copy(os.path.join(entry, name), dest_path)
+
+
+def evict(max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+    """Remove least recently used entries until the store is within its entry and size bounds"""
+    if not os.path.isdir(RESULTS_DIR):
+        return
+    entries = []
+    total = 0
+    for name in os.listdir(RESULTS_DIR):
+        path = os.path.join(RESULTS_DIR, name)
+        meta_path = os.path.join(path, "meta.json")
+        if name.startswith(".") or not os.path.exists(meta_path):
+            continue
+        size = sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+        entries.append((os.path.getmtime(meta_path), size, path))
+        total += size
+    entries.sort()
+    while entries and (len(entries) > max_entries or total > max_bytes):
+        _, size, path = entries.pop(0)
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+def _link_or_copy(src, dest):
+    # Hard links make cache hits free when both live on the same filesystem
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
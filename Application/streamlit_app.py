@@ -6,6 +6,7 @@ def main():
     import re
     import pandas as pd
     import io
+    import survey_model
 
     load_dotenv()
     genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -223,7 +224,11 @@ def main():
                 break
         if survey_text:
             if 'survey_questions' not in st.session_state:
-                st.session_state['survey_questions'] = extract_questions(survey_text)
+                # Structured questions (id, text, type, options) so edits can be applied as small patches
+                st.session_state['survey_questions'] = survey_model.from_lines(extract_questions(survey_text))
+
+            with st.expander(f"Current questions ({len(st.session_state['survey_questions'])})"):
+                st.markdown("\n".join(f"{number}. {survey_model.render(q)}" for number, q in enumerate(st.session_state['survey_questions'], 1)))
             
             if not st.session_state.get('edit_mode'):
                 if st.button("Edit / Ask AI to modify questions", key="edit_ai_btn"):
@@ -234,40 +239,30 @@ def main():
                 st.info("Enter your instructions below (e.g., 'Rephrase question 3', 'Add a question about job', 'Add an income range for less than 25k', etc.) and press Enter.")
                 edit_input = st.text_input("Your edit instructions:", key="edit_input")
                 if edit_input:
-                    # Send current questions and user instructions to Gemini
-                    edit_prompt = (
-                        "Here is the current list of survey questions as a Python list (do not use code formatting or markdown, output plain text only):\n" +
-                        str(st.session_state['survey_questions']) +
-                        "\n\nThe user wants to make the following changes: " + edit_input +
-                        "\nReturn the updated list of questions as a Python list of strings, plain text only, no code formatting or markdown."
+                    # Only the questions the instruction refers to (or a short outline) are sent; the reply is a patch
+                    edit_prompt = survey_model.edit_prompt(
+                        st.session_state['survey_questions'], edit_input,
+                        context=f"The survey is about {st.session_state.requirements.get('topic')} for Indian users."
                     )
                     ai_edit_response = get_gemini_response(edit_prompt)
-                    import ast
                     try:
-                        updated_questions = ast.literal_eval(ai_edit_response)
-                        st.session_state['survey_questions'] = updated_questions
+                        ops = survey_model.parse_ops(ai_edit_response)
+                        # All operations apply or none do, so a bad reply never loses the questionnaire
+                        st.session_state['survey_questions'] = survey_model.apply_ops(st.session_state['survey_questions'], ops)
                         # Reset edit mode
                         st.session_state['edit_mode'] = False
+                        st.session_state.pop('edit_input', None)
                         st.rerun()
                     except Exception:
                         st.error("AI could not parse the updated questions. Please try again or rephrase your instructions.")
             if st.button("Freeze & Download Excel", key="freeze_btn"):
-                # Use AI to generate column names
+                # Use AI to generate column names, only for questions that do not have one yet
                 with st.spinner("Generating Excel template..."):
-                    col_prompt = (
-                        "For each of these survey questions, suggest a short, clear column name (max 25 chars, all caps, no spaces, underscores allowed). "
-                        "Return as a Python list of dicts: [{\"question\": ..., \"column\": ...}] Plain text only, no code formatting or markdown.\n\nQuestions:\n" +
-                        '\n'.join(st.session_state['survey_questions'])
-                    )
-                    ai_col_response = get_gemini_response(col_prompt)
-                    # Try to safely eval the AI's output
-                    import ast
-                    try:
-                        col_map = ast.literal_eval(ai_col_response)
-                        columns = [item['column'] for item in col_map]
-                    except Exception:
-                        # fallback: use questions as columns
-                        columns = [f"Q{i+1}" for i in range(len(st.session_state['survey_questions']))]
+                    questions = st.session_state['survey_questions']
+                    unnamed = [q for q in questions if not q.get('column')]
+                    ai_col_response = get_gemini_response(survey_model.column_prompt(unnamed)) if unnamed else "{}"
+                    # Questions the reply does not name fall back to their id
+                    columns = [q['column'] for q in survey_model.apply_columns(questions, ai_col_response)]
                     df = pd.DataFrame(columns=columns)
                     output = io.BytesIO()
                     df.to_excel(output, index=False)
@@ -0,0 +1,219 @@
+import json
+import threading
+from collections import OrderedDict
+
+# Results of (dataset hash, operation, params), shared by every session; results are small aggregates
+MEMO_ENTRIES = 512
+
+# Standard Net Promoter Score bands on a 0-10 scale
+NPS_PROMOTER_MIN = 9
+NPS_DETRACTOR_MAX = 6
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+OPERATIONS = {}
+
+
+def operation(description, params):
+    """Register an analysis operation with its prompt description and parameter documentation"""
+    def register(fn):
+        OPERATIONS[fn.__name__] = {'fn': fn, 'description': description, 'params': params}
+        return fn
+    return register
+
+
+class AnalysisResult:
+    """A small aggregate table plus how to chart and describe it"""
+
+    def __init__(self, table, title, chart='bar', xlabel=None, ylabel=None, note=None):
+        self.table = table
+        self.title = title
+        self.chart = chart
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.note = note
+
+    def summary(self, max_rows=15):
+        text = self.table.head(max_rows).round(2).to_string()
+        if len(self.table) > max_rows:
+            text += f"\n... ({len(self.table) - max_rows} more rows)"
+        if self.note:
+            text = f"{self.note}\n{text}"
+        return text
+
+
+def _require(df, *columns):
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise Exception(f"Column(s) not found: {', '.join(missing)}")
+
+
+def _flag(value, name):
+    """Boolean parameter as the model may write it: true/false, "true"/"false", "yes"/"no", 1/0 or null"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ("true", "yes", "1", "y", "on"):
+        return True
+    if text in ("false", "no", "0", "n", "off", "", "null", "none"):
+        return False
+    raise Exception(f"Invalid value for {name}: {value!r} (expected true or false)")
+
+
+@operation("Count (or share) of each answer in a column", {'column': "column name", 'normalize': "true for percentages", 'top': "max categories (default 20)"})
+def value_counts(df, column, normalize=False, top=20):
+    _require(df, column)
+    normalize = _flag(normalize, 'normalize')
+    counts = df[column].value_counts(normalize=normalize, dropna=True).head(int(top))
+    if normalize:
+        counts = counts * 100
+    table = counts.rename('percent' if normalize else 'count').to_frame()
+    return AnalysisResult(table, f"{column} distribution", 'barh', ylabel=column, xlabel='%' if normalize else 'Responses')
+
+
+@operation("Cross-tabulation of two answer columns", {'row': "column for rows", 'column': "column for columns", 'normalize': "'row', 'column' or null for counts"})
+def crosstab(df, row, column, normalize=None):
+    _require(df, row, column)
+    import pandas as pd
+    normalize_arg = {'row': 'index', 'index': 'index', 'column': 'columns', 'columns': 'columns'}.get(normalize, False)
+    table = pd.crosstab(df[row], df[column], normalize=normalize_arg)
+    if normalize_arg:
+        table = table * 100
+    return AnalysisResult(table, f"{row} by {column}", 'stacked', xlabel=row, ylabel='%' if normalize_arg else 'Responses')
+
+
+@operation("Percentage of each level for one or more Likert/rating questions", {'columns': "list of column names", 'order': "optional list of levels, lowest to highest"})
+def likert_distribution(df, columns, order=None):
+    if isinstance(columns, str):
+        columns = [columns]
+    _require(df, *columns)
+    import pandas as pd
+    shares = {c: df[c].value_counts(normalize=True) * 100 for c in columns}
+    table = pd.DataFrame(shares).T.fillna(0)
+    if order:
+        table = table.reindex(columns=[level for level in order if level in table.columns] + [level for level in table.columns if level not in order])
+    else:
+        table = table.reindex(columns=sorted(table.columns, key=str))
+    return AnalysisResult(table, "Response distribution", 'stacked_h', xlabel='%')
+
+
+@operation("Net Promoter Score from a 0-10 recommendation question, optionally per group", {'column': "0-10 score column", 'by': "optional grouping column"})
+def nps(df, column, by=None):
+    import pandas as pd
+    _require(df, column, *([by] if by else []))
+    scores = pd.to_numeric(df[column], errors='coerce')
+    valid = scores.notna().to_numpy()
+    promoter = (scores >= NPS_PROMOTER_MIN).to_numpy(dtype=float)
+    detractor = (scores <= NPS_DETRACTOR_MAX).to_numpy(dtype=float)
+    frame = pd.DataFrame({'promoter': promoter, 'detractor': detractor})[valid]
+    if by:
+        frame['group'] = df[by].to_numpy()[valid]
+        grouped = frame.groupby('group', observed=True)
+        table = pd.DataFrame({
+            'responses': grouped.size(),
+            'promoters_%': grouped['promoter'].mean() * 100,
+            'detractors_%': grouped['detractor'].mean() * 100,
+        })
+    else:
+        table = pd.DataFrame({
+            'responses': [len(frame)],
+            'promoters_%': [frame['promoter'].mean() * 100],
+            'detractors_%': [frame['detractor'].mean() * 100],
+        }, index=['All'])
+    table['nps'] = table['promoters_%'] - table['detractors_%']
+    note = None if by else f"NPS: {table['nps'].iloc[0]:.1f} ({int(table['responses'].iloc[0])} responses)"
+    return AnalysisResult(table.sort_values('nps', ascending=False) if by else table, f"NPS{' by ' + by if by else ''}", 'bar_nps', xlabel=by, ylabel='NPS', note=note)
+
+
+@operation("Mean (and count) of a numeric column per group", {'value': "numeric column", 'by': "grouping column or list of columns"})
+def grouped_mean(df, value, by):
+    import pandas as pd
+    groups = [by] if isinstance(by, str) else list(by)
+    _require(df, value, *groups)
+    values = pd.to_numeric(df[value], errors='coerce')
+    grouped = values.groupby([df[g] for g in groups], observed=True)
+    table = pd.DataFrame({'mean': grouped.mean(), 'responses': grouped.count()}).sort_values('mean', ascending=False)
+    return AnalysisResult(table, f"Average {value} by {', '.join(groups)}", 'bar_mean', ylabel=f"Mean {value}")
+
+
+@operation("Responses (or mean of a value) over time", {'date_column': "date/time column", 'value': "optional numeric column to average", 'freq': "'D', 'W', 'M' (default), 'Q' or 'Y'"})
+def time_trend(df, date_column, value=None, freq='M'):
+    import pandas as pd
+    _require(df, date_column, *([value] if value else []))
+    dates = pd.to_datetime(df[date_column], errors='coerce')
+    period = dates.dt.to_period({'M': 'M', 'ME': 'M', 'Q': 'Q', 'Y': 'Y', 'A': 'Y', 'W': 'W', 'D': 'D'}.get(str(freq).upper(), 'M'))
+    if value:
+        series = pd.to_numeric(df[value], errors='coerce').groupby(period).mean().rename(f"mean {value}")
+    else:
+        series = period.value_counts().sort_index().rename('responses')
+    table = series.to_frame()
+    table.index = table.index.astype(str)
+    return AnalysisResult(table, f"{'Average ' + value if value else 'Responses'} over time", 'line', xlabel=date_column)
+
+
+def run(dataset_hash, df, name, params):
+    """Run a registered operation, memoized per (dataset hash, operation, params)"""
+    if name not in OPERATIONS:
+        raise Exception(f"Unknown analysis operation: {name}")
+    params = dict(params or {})
+    key = (dataset_hash, name, json.dumps(params, sort_keys=True, default=str))
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    try:
+        result = OPERATIONS[name]['fn'](df, **params)
+    except TypeError as e:
+        raise Exception(f"Invalid parameters for {name}: {str(e)}")
+    with _memo_lock:
+        _memo[key] = result
+        while len(_memo) > MEMO_ENTRIES:
+            _memo.popitem(last=False)
+    return result
+
+
+def operations_prompt():
+    """Catalog of operations for the LLM prompt"""
+    lines = []
+    for name, spec in OPERATIONS.items():
+        params = "; ".join(f"{p}: {doc}" for p, doc in spec['params'].items())
+        lines.append(f"- {name}: {spec['description']}. Params: {params}")
+    return "\n".join(lines)
+
+
+def plot(result):
+    """Matplotlib figure for an analysis result"""
+    import matplotlib.pyplot as plt
+
+    table = result.table
+    fig, ax = plt.subplots(figsize=(8, max(3, min(0.35 * len(table) + 1.5, 10)) if result.chart in ('barh', 'stacked_h') else 4.5))
+    if result.chart == 'barh':
+        table.iloc[::-1, 0].plot.barh(ax=ax)
+    elif result.chart == 'stacked':
+        table.plot.bar(stacked=True, ax=ax)
+        ax.legend(fontsize='small', bbox_to_anchor=(1.01, 1), loc='upper left')
+    elif result.chart == 'stacked_h':
+        table.iloc[::-1].plot.barh(stacked=True, ax=ax)
+        ax.legend(fontsize='small', bbox_to_anchor=(1.01, 1), loc='upper left')
+    elif result.chart == 'bar_nps':
+        table['nps'].plot.bar(ax=ax, color=['#2a9d8f' if v >= 0 else '#e76f51' for v in table['nps']])
+        ax.axhline(0, color='black', linewidth=0.8)
+    elif result.chart == 'bar_mean':
+        series = table['mean']
+        if series.index.nlevels > 1:
+            series.index = [" / ".join(map(str, idx)) for idx in series.index]
+        series.plot.bar(ax=ax)
+    elif result.chart == 'line':
+        table.plot(ax=ax, marker='o', legend=table.shape[1] > 1)
+    else:
+        table.plot.bar(ax=ax, legend=table.shape[1] > 1)
+    ax.set_title(result.title)
+    if result.xlabel:
+        ax.set_xlabel(result.xlabel)
+    if result.ylabel:
+        ax.set_ylabel(result.ylabel)
+    fig.tight_layout()
+    return fig
@@ -1,12 +1,18 @@
 def main():
     import streamlit as st
-    import pandas as pd
     import google.generativeai as genai
     import os
     from dotenv import load_dotenv
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    import io
+    import analysis_sandbox
+    import answer_cache
+    import figure_cache
+    from chat_history import ChatHistory
+    import survey_store
+    import survey_merge
+    import survey_profile
+    import survey_analytics
+    import survey_sql
+    import survey_themes
 
     load_dotenv()
     genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -16,76 +22,136 @@ def main():
         response = model.generate_content(prompt)
         return response.text
 
+    # One memory-mapped DataFrame per dataset, shared by reruns and every session that opens the same file
+    @st.cache_resource(max_entries=8)
+    def get_dataset(dataset_hash):
+        return survey_store.load_dataframe(dataset_hash)
+
+    # Generated Python runs in these resource-limited worker processes, started once per server
+    @st.cache_resource
+    def get_sandbox_pool():
+        return analysis_sandbox.SandboxPool()
+
     st.set_page_config(page_title="Suzuki Survey Analyzer", page_icon="Suzuki logo.jpg")
     st.title("Suzuki Survey Analyzer")
     st.markdown("Upload your completed survey data to generate insights, visualizations, and actionable recommendations.")
 
     if 'analyzer_chat_history' not in st.session_state:
-        st.session_state['analyzer_chat_history'] = []
+        st.session_state['analyzer_chat_history'] = ChatHistory()
     if 'df' not in st.session_state:
         st.session_state['df'] = None
+    if 'dataset_hash' not in st.session_state:
+        st.session_state['dataset_hash'] = None
     if 'data_profile' not in st.session_state:
         st.session_state['data_profile'] = None
-
-    uploaded_file = st.file_uploader("Choose a CSV or Excel file", type=["csv", "xlsx"])
-
-    if uploaded_file is not None and st.session_state.df is None:
+    if 'upload_key' not in st.session_state:
+        st.session_state['upload_key'] = None
+
+    # SQL mode runs model-written queries in embedded DuckDB directly over the stored Arrow file
+    sql_mode = False
+    if survey_sql.is_available():
+        with st.sidebar:
+            sql_mode = st.radio("Custom analysis engine", ["Python (pandas)", "SQL (DuckDB)"], index=1) == "SQL (DuckDB)"
+
+    def reset_chat():
+        # Releases the history's spill workspace along with its messages
+        st.session_state.analyzer_chat_history.close()
+        st.session_state.analyzer_chat_history = ChatHistory()
+
+    with st.sidebar:
+        if st.button("Clear chat"):
+            reset_chat()
+
+    def load_dataset(dataset_hash, upload_key, message):
+        if dataset_hash != st.session_state.dataset_hash:
+            # Earlier answers are about the previous data
+            reset_chat()
+        st.session_state.dataset_hash = dataset_hash
+        st.session_state.df = get_dataset(dataset_hash)
+        # Compact profile for AI context; column stats are computed lazily and cached by file hash
+        st.session_state.data_profile = survey_profile.prompt_profile(dataset_hash)
+        st.session_state.upload_key = upload_key
+        st.session_state.analyzer_chat_history.append({"role": "assistant", "content": message})
+
+    uploaded_files = st.file_uploader("Choose a CSV or Excel file (or several regional files to consolidate)", type=["csv", "xlsx"], accept_multiple_files=True)
+    upload_key = sorted((f.name, f.size) for f in uploaded_files)
+
+    if len(uploaded_files) == 1 and st.session_state.upload_key != upload_key:
         with st.spinner('Analyzing your data...'):
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
-                st.session_state.df = df
-
-                # Generate data profile for AI context
-                profile_buffer = io.StringIO()
-                st.session_state.df.info(buf=profile_buffer)
-                profile_info = profile_buffer.getvalue()
-                data_profile = f"""
-                Data Summary:
-                - Shape: {st.session_state.df.shape}
-                - Columns and Data Types:
-                {profile_info}
-                - Descriptive Statistics:
-                {st.session_state.df.describe().to_string()}
-                - First 5 rows:
-                {st.session_state.df.head().to_string()}
-                """
-                st.session_state.data_profile = data_profile
-                st.session_state.analyzer_chat_history.append({"role": "assistant", "content": "Your data has been loaded and analyzed. What would you like to know?"})
-
+                # Parsed once per file content into the Arrow store; the session only holds a reference
+                dataset_hash = survey_store.ingest(uploaded_files[0], uploaded_files[0].name)
+                load_dataset(dataset_hash, upload_key, "Your data has been loaded and analyzed. What would you like to know?")
             except Exception as e:
                 st.error(f"Failed to load or process the file: {e}")
 
+    elif len(uploaded_files) > 1:
+        with st.expander("Consolidation options"):
+            template_file = st.file_uploader("Survey template (optional, its header row defines the columns)", type=["csv", "xlsx"], key="template_file")
+            key_text = st.text_input("Respondent key columns (comma-separated; empty removes rows identical in every answer)", value=survey_merge.DEDUPE_KEY)
+        upload_key = [upload_key, template_file.name if template_file else None, key_text]
+        if st.session_state.upload_key != upload_key and st.button(f"Consolidate {len(uploaded_files)} files"):
+            with st.spinner(f'Consolidating {len(uploaded_files)} files...'):
+                try:
+                    # Parsed in parallel processes, aligned to the template and stored as one Arrow dataset
+                    columns = survey_merge.template_columns(template_file) if template_file else None
+                    dataset_hash, report = survey_merge.consolidate(uploaded_files, columns, survey_merge.parse_key(key_text))
+                    summary = survey_merge.report_text(report) if report else f"Consolidated {len(uploaded_files)} files."
+                    load_dataset(dataset_hash, upload_key, f"{summary}\n\nThe combined data has been loaded and analyzed. What would you like to know?")
+                except Exception as e:
+                    st.error(f"Failed to consolidate the files: {e}")
+
     if st.session_state.df is not None:
         st.subheader("Data Preview")
         st.dataframe(st.session_state.df.head())
 
-        # Display chat history
-        for message in st.session_state.analyzer_chat_history:
+        def show_message(message):
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
-                if "figure" in message:
-                    st.pyplot(message["figure"])
+                # Messages hold the path of a cached PNG, never a live figure
+                if message.get("figure") and os.path.exists(message["figure"]):
+                    st.image(message["figure"])
+                if message.get("cached_from"):
+                    st.caption(f"Reused the answer to an earlier, similar question: \"{message['cached_from']}\"")
+
+        # Display chat history; older turns are on disk and only read back on request
+        history = st.session_state.analyzer_chat_history
+        if history.spilled and st.toggle(f"Show {history.spilled} earlier messages"):
+            for message in history.older():
+                show_message(message)
+        for message in history.recent:
+            show_message(message)
 
         if user_input := st.chat_input("Ask about your data..."):
             st.session_state.analyzer_chat_history.append({"role": "user", "content": user_input})
             with st.chat_message("user"):
                 st.markdown(user_input)
 
+            # Near-identical questions on the same dataset reuse the stored answer: no model call, no code run
+            cached = answer_cache.lookup(st.session_state.dataset_hash, user_input)
+            if cached:
+                message, matched_question = cached
+                st.session_state.analyzer_chat_history.append({**message, "cached_from": matched_question})
+                st.rerun()
+
             with st.spinner("Thinking..."):
                 # Get last 3 chat messages for context
                 chat_context = "\n".join([
-                    f"{m['role'].capitalize()}: {m['content']}" for m in st.session_state.analyzer_chat_history[-3:] if 'content' in m
+                    f"{m['role'].capitalize()}: {m['content']}" for m in st.session_state.analyzer_chat_history.last(3) if 'content' in m
                 ])
+                if sql_mode:
+                    custom_action = f"""**Run SQL**: Only if no analysis operation fits and the user wants a custom aggregation, filter or plot. Write ONE DuckDB SELECT query over this table (quote column names with double quotes): {survey_sql.schema_prompt(st.session_state.dataset_hash)}. Return aggregated rows (label column first, then numeric columns), not raw responses. Set "chart" to "bar", "line" or "table"."""
+                    custom_format = """- For SQL: {"type": "sql", "title": "Average age by city", "chart": "bar", "query": "SELECT \\"CITY\\", AVG(\\"AGE\\") AS avg_age FROM survey GROUP BY 1 ORDER BY 2 DESC"}"""
+                else:
+                    custom_action = """**Generate Python Code**: Only if no analysis operation fits and the user wants a visualization or a specific data manipulation. The code should use the pandas DataFrame `df` and generate a plot using Matplotlib or Seaborn. The plot must be assigned to a variable `fig`."""
+                    custom_format = """- For a plot: {"type": "python", "code": "import matplotlib.pyplot as plt\nimport seaborn as sns\nfig, ax = plt.subplots()\n# Your code here, using 'df'\nsns.histplot(df['AGE'], ax=ax)\nax.set_title('Age Distribution')"}"""
                 prompt = f"""
                 You are an expert data analyst for Suzuki. Your task is to analyze the provided survey data based on user requests.
 
                 You must only use the uploaded survey data and the provided data profile for your answers. Do not use any outside knowledge or make up information. If the answer cannot be found in the data, say so clearly.
 
                 Here is a profile of the data:
-                {st.session_state.data_profile}
+                {survey_profile.prompt_profile(st.session_state.dataset_hash, question=user_input)}
 
                 Recent conversation context:
                 {chat_context}
@@ -96,12 +162,15 @@ def main():
 
                 Based on the user's request, decide on ONE of the following actions:
                 1.  **Answer Directly**: If the question can be answered from the data profile or is a general query.
-                2.  **Generate Python Code**: If the user wants a visualization or a specific data manipulation. The code should use the pandas DataFrame `df` and generate a plot using Matplotlib or Seaborn. The plot must be assigned to a variable `fig`.
-                3.  **Summarize Text**: If the user wants to understand qualitative feedback from a specific column. Identify the column name.
+                2.  **Run Analysis**: Preferred for standard survey questions (distributions, crosstabs, Likert scales, NPS, group averages, trends over time). Pick one of these operations and fill in its parameters with exact column names:
+                {survey_analytics.operations_prompt()}
+                3.  {custom_action}
+                4.  **Summarize Text**: If the user wants to understand qualitative feedback from a specific column. Identify the column name.
 
                 Respond with a JSON object ONLY, in one of the following formats:
                 - For a direct answer: {{"type": "answer", "content": "Your textual answer here."}}
-                - For a plot: {{"type": "python", "code": "import matplotlib.pyplot as plt\nimport seaborn as sns\nfig, ax = plt.subplots()\n# Your code here, using 'df'\nsns.histplot(df['AGE'], ax=ax)\nax.set_title('Age Distribution')"}}
+                - For an analysis: {{"type": "analysis", "operation": "crosstab", "params": {{"row": "CITY", "column": "SATISFACTION", "normalize": "row"}}}}
+                {custom_format}
                 - For a summary: {{"type": "summary", "column": "COLUMN_NAME"}}
                 """
                 ai_response_str = get_gemini_response(prompt).strip()
@@ -118,25 +187,50 @@ def main():
                     if response_type == "answer":
                         bot_message["content"] = ai_response.get("content", "I am not sure how to answer that.")
                     
+                    elif response_type == "analysis":
+                        # Vectorized, memoized operation: repeated questions on the same file never recompute
+                        result = survey_analytics.run(st.session_state.dataset_hash, st.session_state.df, ai_response.get("operation"), ai_response.get("params"))
+                        bot_message["content"] = f"**{result.title}**\n\n```\n{result.summary()}\n```"
+                        # Rendered to PNG once per (file, operation, params) and closed
+                        key = figure_cache.figure_key("analysis", ai_response.get("operation"), ai_response.get("params"))
+                        bot_message["figure"] = figure_cache.get_or_render(st.session_state.dataset_hash, key, lambda: survey_analytics.plot(result))
+
+                    elif response_type == "sql":
+                        # Multi-threaded columnar execution over the memory-mapped file; no DataFrame copies
+                        frame = survey_sql.run_query(st.session_state.dataset_hash, ai_response.get("query", ""))
+                        result = survey_sql.result_to_analysis(frame, ai_response.get("title") or "Query result", ai_response.get("chart"))
+                        bot_message["content"] = f"**{result.title}**\n\n```\n{result.summary()}\n```"
+                        if result.chart != 'table' and len(frame):
+                            key = figure_cache.figure_key("sql", ai_response.get("query"), result.title, result.chart)
+                            bot_message["figure"] = figure_cache.get_or_render(st.session_state.dataset_hash, key, lambda: survey_analytics.plot(result))
+
                     elif response_type == "python":
                         code_to_execute = ai_response.get("code")
                         bot_message["content"] = f"Certainly! Here is the plot you requested.\n"
                         
-                        # Execute the code
-                        local_scope = {"df": st.session_state.df, "plt": plt, "sns": sns, "pd": pd}
-                        exec(code_to_execute, local_scope)
-                        bot_message["figure"] = local_scope.get('fig')
+                        # Sandboxed worker process: reads the memory-mapped dataset itself and returns only the PNG
+                        key = figure_cache.figure_key("python", code_to_execute)
+                        bot_message["figure"] = figure_cache.get_or_render(st.session_state.dataset_hash, key, lambda: get_sandbox_pool().run(code_to_execute, st.session_state.dataset_hash))
 
                     elif response_type == "summary":
                         column_to_summarize = ai_response.get("column")
                         if column_to_summarize in st.session_state.df.columns:
-                            text_data = "\n".join(st.session_state.df[column_to_summarize].dropna().astype(str).tolist())
-                            summary_prompt = f"Summarize the following user feedback from the Suzuki survey. Identify key themes, positive points, and areas for improvement.\n\nFeedback:\n{text_data}"
-                            summary = get_gemini_response(summary_prompt)
-                            bot_message["content"] = f"Here is a summary of the '{column_to_summarize}' column:\n\n{summary}"
+                            # Clustered locally first: only theme sizes and a few representative answers reach the model
+                            themes = survey_themes.column_themes(st.session_state.dataset_hash, st.session_state.df, column_to_summarize)
+                            if themes:
+                                summary_prompt = f"The following themes were found by clustering the answers to the '{column_to_summarize}' question of the Suzuki survey. For each theme, give it a short name and describe it using its keywords and example responses; then summarize positive points and areas for improvement, weighting themes by their size. Only use the information below.\n\n{survey_themes.themes_prompt(themes)}"
+                                summary = get_gemini_response(summary_prompt)
+                                bot_message["content"] = f"Here is a summary of the '{column_to_summarize}' column:\n\n{summary}\n\n**Theme sizes**\n\n{survey_themes.themes_table(themes)}"
+                            else:
+                                text_data = "\n".join(st.session_state.df[column_to_summarize].dropna().astype(str).tolist())
+                                summary_prompt = f"Summarize the following user feedback from the Suzuki survey. Identify key themes, positive points, and areas for improvement.\n\nFeedback:\n{text_data}"
+                                summary = get_gemini_response(summary_prompt)
+                                bot_message["content"] = f"Here is a summary of the '{column_to_summarize}' column:\n\n{summary}"
                         else:
                             bot_message["content"] = f"I couldn't find the column '{column_to_summarize}' to summarize."
 
+                    if "content" in bot_message:
+                        answer_cache.store(st.session_state.dataset_hash, user_input, bot_message)
                     st.session_state.analyzer_chat_history.append(bot_message)
                     st.rerun()
 
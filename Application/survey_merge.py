@@ -0,0 +1,222 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import result_cache
+import survey_store
+
+# Regional files are parsed in parallel processes (Excel parsing is single-threaded per file)
+PARSE_WORKERS = int(os.getenv("SURVEY_PARSE_WORKERS", str(min(8, os.cpu_count() or 2))))
+# Default respondent key for deduplication; empty means rows identical in every answer column
+DEDUPE_KEY = os.getenv("SURVEY_DEDUPE_KEY", "")
+SOURCE_COLUMN = "SOURCE_FILE"
+
+
+def normalize_name(name):
+    """Column name as compared across files: 'Purchase intent ' matches 'PURCHASE_INTENT'"""
+    return re.sub(r"[^0-9A-Z]+", "_", str(name).strip().upper()).strip("_")
+
+
+def template_columns(uploaded_template):
+    """Column names from the header row of a survey template (as exported by the survey designer)"""
+    import pandas as pd
+
+    extension = os.path.splitext(uploaded_template.name)[1].lower()
+    uploaded_template.seek(0)
+    if extension == '.csv':
+        header = pd.read_csv(uploaded_template, nrows=0)
+    else:
+        header = pd.read_excel(uploaded_template, nrows=0)
+    return [str(column) for column in header.columns]
+
+
+def parse_key(text):
+    return [part.strip() for part in (text or "").split(",") if part.strip()]
+
+
+def report_path(dataset_hash):
+    return os.path.join(survey_store.STORE_DIR, f"{dataset_hash}.ingest.json")
+
+
+def consolidate(uploaded_files, columns=None, dedupe_key=None):
+    """Parse several survey files in parallel, align them to one schema, drop duplicate respondents
+    and store the result as a single dataset. Returns (dataset hash, consolidation report).
+
+    columns is the template's column list (default: every column seen, in order of first appearance);
+    dedupe_key is a list of column names identifying a respondent.
+    """
+    dedupe_key = parse_key(DEDUPE_KEY) if dedupe_key is None else list(dedupe_key)
+    os.makedirs(survey_store.STORE_DIR, exist_ok=True)
+    uploads = []
+    try:
+        for uploaded_file in uploaded_files:
+            extension = os.path.splitext(uploaded_file.name)[1].lower()
+            raw_path = os.path.join(survey_store.STORE_DIR, f".upload.{uuid.uuid4().hex}{extension}")
+            file_hash = result_cache.copy_and_hash(uploaded_file, raw_path)
+            uploads.append((uploaded_file.name, file_hash, raw_path, extension))
+        # Sorted so the result (including which duplicate is kept) does not depend on upload order
+        uploads.sort(key=lambda upload: (upload[0], upload[1]))
+        dataset_hash = hashlib.sha256(json.dumps({
+            'files': [[name, file_hash] for name, file_hash, _, _ in uploads],
+            'columns': columns,
+            'key': dedupe_key,
+        }).encode("utf-8")).hexdigest()
+
+        with survey_store.ingest_lock(dataset_hash):
+            path = survey_store.dataset_path(dataset_hash)
+            if os.path.exists(path):
+                os.utime(path)
+                try:
+                    with open(report_path(dataset_hash), encoding="utf-8") as f:
+                        return dataset_hash, json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    return dataset_hash, None
+            tables = _parse_all([(raw_path, extension) for _, _, raw_path, extension in uploads])
+            table, report = align([name for name, _, _, _ in uploads], tables, columns)
+            table, report['duplicates_removed'] = dedupe(table, dedupe_key)
+            report['rows'] = table.num_rows
+            report['key'] = dedupe_key
+            survey_store.write_dataset(survey_store.encode_categoricals(table), path)
+            _write_report(dataset_hash, report)
+            survey_store.evict()
+    finally:
+        for _, _, raw_path, _ in uploads:
+            if os.path.exists(raw_path):
+                os.unlink(raw_path)
+    return dataset_hash, report
+
+
+def _parse_one(args):
+    path, extension = args
+    return survey_store.parse_table(path, extension)
+
+
+def _parse_all(jobs):
+    workers = min(PARSE_WORKERS, len(jobs))
+    if workers <= 1:
+        return [_parse_one(job) for job in jobs]
+    # spawn: never fork the (multi-threaded) Streamlit server
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(_parse_one, jobs))
+
+
+def align(sources, tables, columns=None):
+    """Concatenate tables under one schema, matching columns by normalized name.
+
+    Columns missing from a file are null for its rows; columns outside the template are dropped.
+    Each row records the file it came from in SOURCE_FILE.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if columns is None:
+        columns = [name for table in tables for name in table.column_names]
+    wanted = {}
+    for column in columns:
+        wanted.setdefault(normalize_name(column), column)
+
+    report = {'files': []}
+    matched = []
+    for source, table in zip(sources, tables):
+        by_name = {}
+        for name in table.column_names:
+            by_name.setdefault(normalize_name(name), name)
+        matched.append(by_name)
+        report['files'].append({
+            'name': source,
+            'rows': table.num_rows,
+            'missing': [column for key, column in wanted.items() if key not in by_name],
+            'extra': [name for key, name in by_name.items() if key not in wanted],
+        })
+
+    types = {key: _common_type([table.column(by_name[key]) for table, by_name in zip(tables, matched) if key in by_name]) for key in wanted}
+    parts = []
+    for source, table, by_name in zip(sources, tables, matched):
+        arrays = []
+        for key in wanted:
+            if key in by_name:
+                arrays.append(pc.cast(table.column(by_name[key]), types[key]))
+            else:
+                arrays.append(pa.nulls(table.num_rows, types[key]))
+        arrays.append(pa.array([source] * table.num_rows, pa.string()))
+        parts.append(pa.Table.from_arrays(arrays, names=list(wanted.values()) + [SOURCE_COLUMN]))
+    return pa.concat_tables(parts).combine_chunks(), report
+
+
+def _common_type(columns):
+    """Type one column gets across files: shared type, widened number, or text when files disagree"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    def is_number(t):
+        return pa.types.is_integer(t) or pa.types.is_floating(t)
+
+    types = {column.type for column in columns if not pa.types.is_null(column.type)}
+    if len(types) == 1:
+        return types.pop()
+    if types and all(pa.types.is_integer(t) for t in types):
+        return pa.int64()
+    if types and all(is_number(t) for t in types):
+        return pa.float64()
+    if any(is_number(t) for t in types) and all(is_number(t) or pa.types.is_string(t) for t in types):
+        # Numbers typed in as text in some regional files
+        try:
+            for column in columns:
+                if pa.types.is_string(column.type):
+                    pc.cast(column, pa.float64())
+            return pa.float64()
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    return pa.string()
+
+
+def dedupe(table, key=None):
+    """Drop repeated respondents, keeping the first occurrence. Returns (table, rows removed).
+
+    With a key, rows match on the key columns (rows with a missing key value are kept); without one,
+    on every answer column.
+    """
+    import pyarrow as pa
+
+    if key:
+        by_name = {normalize_name(name): name for name in table.column_names}
+        missing = [column for column in key if normalize_name(column) not in by_name]
+        if missing:
+            raise Exception(f"Respondent key column(s) not found: {', '.join(missing)}")
+        frame = table.select([by_name[normalize_name(column)] for column in key]).to_pandas()
+        duplicated = frame.duplicated(keep='first').to_numpy() & frame.notna().all(axis=1).to_numpy()
+    else:
+        frame = table.drop_columns([SOURCE_COLUMN]).to_pandas()
+        duplicated = frame.duplicated(keep='first').to_numpy()
+    removed = int(duplicated.sum())
+    if removed:
+        table = table.filter(pa.array(~duplicated))
+    return table, removed
+
+
+def _write_report(dataset_hash, report):
+    path = report_path(dataset_hash)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def report_text(report):
+    """Markdown summary of a consolidation for the chat"""
+    lines = [f"Consolidated {len(report['files'])} files into {report['rows']} responses"
+             f" ({report['duplicates_removed']} duplicates removed{' by ' + ', '.join(report['key']) if report['key'] else ''})."]
+    for entry in report['files']:
+        notes = []
+        if entry['missing']:
+            notes.append(f"missing {', '.join(entry['missing'])}")
+        if entry['extra']:
+            notes.append(f"ignored {', '.join(entry['extra'])}")
+        if notes:
+            lines.append(f"- {entry['name']} ({entry['rows']} rows): {'; '.join(notes)}")
+    return "\n".join(lines)
@@ -0,0 +1,166 @@
+import json
+import re
+
+# Question dicts: {"id": "Q7", "text": ..., "type": ..., "options": [...], "column": ...}
+QUESTION_TYPES = ("open", "single_choice", "multiple_choice", "rating", "yes_no")
+OUTLINE_WORDS = 8
+
+_OPTIONS = re.compile(r"\s*[\(\[]([^()\[\]]*[/,;][^()\[\]]*)[\)\]]\s*$")
+_SCALE = re.compile(r"\b(\d+)\s*(?:-|to)\s*(\d+)\b")
+_REFERENCE = re.compile(r"(?:\bq|\bquestions?|\bno\.?|#)\s*(\d+(?:\s*(?:,|and|&|-|to)\s*\d+)*)", re.IGNORECASE)
+
+
+def from_lines(lines):
+    """Structured questions from extracted question lines; trailing "(a / b / c)" becomes the options"""
+    return [dict(parse_line(line), id=f"Q{number}") for number, line in enumerate(lines, 1)]
+
+
+def parse_line(line):
+    text, options = line.strip(), []
+    match = _OPTIONS.search(text)
+    if match:
+        options = [part.strip() for part in re.split(r"[/,;]", match.group(1)) if part.strip()]
+        text = text[:match.start()].rstrip()
+    question_type = "open"
+    if options:
+        question_type = "yes_no" if {o.lower() for o in options} <= {"yes", "no"} else "single_choice"
+    elif _SCALE.search(text) and re.search(r"\b(rate|scale|rating)\b", text, re.IGNORECASE):
+        question_type = "rating"
+    return {"text": text, "type": question_type, "options": options}
+
+
+def outline(questions, words=OUTLINE_WORDS):
+    """One short line per question: position, id and the first few words"""
+    lines = []
+    for number, question in enumerate(questions, 1):
+        head = question["text"].split()
+        short = " ".join(head[:words]) + (" …" if len(head) > words else "")
+        lines.append(f"{number}. {question['id']}: {short}")
+    return "\n".join(lines)
+
+
+def render(question):
+    """Full text of one question, as shown to users and the model"""
+    line = question["text"]
+    if question.get("options"):
+        line += f" ({' / '.join(question['options'])})"
+    return line
+
+
+def affected_questions(questions, instruction):
+    """Questions an edit instruction refers to, by number ("question 37") or id ("Q37")"""
+    numbers = set()
+    for group in _REFERENCE.findall(instruction):
+        for start, end in re.findall(r"(\d+)(?:\s*(?:-|to)\s*(\d+))?", group):
+            numbers.update(range(int(start), int(end or start) + 1))
+    return [q for position, q in enumerate(questions, 1) if position in numbers or q["id"] in {f"Q{n}" for n in numbers}]
+
+
+def edit_prompt(questions, instruction, context=""):
+    """Prompt asking for patch operations; only referenced questions are sent in full.
+
+    Without explicit references the model gets a compact outline to locate the questions itself, so
+    the prompt grows with survey length only by a few words per question.
+    """
+    affected = affected_questions(questions, instruction)
+    if affected:
+        shown = "\n".join(f"{q['id']} (position {questions.index(q) + 1}, {q['type']}): {json.dumps(render(q), ensure_ascii=False)}" for q in affected)
+        survey = f"The survey has {len(questions)} questions with ids {questions[0]['id']} to {questions[-1]['id']}.\nQuestions referred to:\n{shown}"
+    else:
+        survey = f"Survey outline ({len(questions)} questions; position. id: first words):\n{outline(questions)}"
+    return f"""You edit a survey questionnaire by returning patch operations. {context}
+{survey}
+
+Edit instruction: "{instruction}"
+
+Respond with JSON only, no markdown: {{"ops": [...]}} using these operations (ids as shown above; "after" is an id, "start", or null for the end):
+- {{"op": "update", "id": "Q3", "text": "...", "type": "{'|'.join(QUESTION_TYPES)}", "options": ["..."]}} (omit fields that do not change)
+- {{"op": "add", "after": "Q5", "text": "...", "type": "single_choice", "options": ["..."]}}
+- {{"op": "delete", "id": "Q7"}}
+- {{"op": "reorder", "id": "Q7", "after": "Q2"}}
+Use only the operations the instruction needs. Keep the Indian context (INR, locations) for new options."""
+
+
+def parse_ops(response_text):
+    text = response_text.strip().replace('```json', '').replace('```', '').strip()
+    ops = json.loads(text)
+    if isinstance(ops, dict):
+        ops = ops.get("ops", [])
+    if not isinstance(ops, list):
+        raise Exception("Edit response has no list of operations.")
+    return ops
+
+
+def apply_ops(questions, ops):
+    """New question list with the operations applied; raises without changing anything if one is invalid"""
+    questions = [dict(q) for q in questions]
+    next_id = max([int(q["id"][1:]) for q in questions if q["id"][1:].isdigit()], default=0) + 1
+
+    def position(question_id):
+        for index, question in enumerate(questions):
+            if question["id"] == question_id:
+                return index
+        raise Exception(f"Unknown question id: {question_id}")
+
+    def insert_at(after):
+        if after in (None, "", "end"):
+            return len(questions)
+        if after == "start":
+            return 0
+        return position(after) + 1
+
+    for op in ops:
+        kind = op.get("op")
+        if kind == "update":
+            question = questions[position(op.get("id"))]
+            for field in ("text", "type", "options"):
+                if op.get(field) is not None:
+                    question[field] = op[field]
+            if question["type"] not in QUESTION_TYPES:
+                question["type"] = "open"
+            # The export column name is regenerated for the changed question only
+            question.pop("column", None)
+        elif kind == "add":
+            if not op.get("text"):
+                raise Exception("An added question needs text.")
+            question_type = op.get("type") if op.get("type") in QUESTION_TYPES else "open"
+            question = {"id": f"Q{next_id}", "text": op["text"], "type": question_type, "options": list(op.get("options") or [])}
+            next_id += 1
+            questions.insert(insert_at(op.get("after")), question)
+        elif kind == "delete":
+            questions.pop(position(op.get("id")))
+        elif kind in ("reorder", "move"):
+            question = questions.pop(position(op.get("id")))
+            questions.insert(insert_at(op.get("after")), question)
+        else:
+            raise Exception(f"Unknown edit operation: {kind}")
+    return questions
+
+
+def column_prompt(questions):
+    """Prompt for export column names of the given questions, as a JSON object keyed by id"""
+    listed = "\n".join(f"{q['id']}: {q['text']}" for q in questions)
+    return ("For each of these survey questions, suggest a short, clear column name (max 25 chars, all caps, no spaces, underscores allowed). "
+            "Respond with a JSON object only, mapping question id to column name, e.g. {\"Q1\": \"AGE\"}. No markdown.\n\nQuestions:\n" + listed)
+
+
+def apply_columns(questions, response_text):
+    """Store column names from a column_prompt response; questions without a valid name fall back to their id"""
+    try:
+        names = json.loads(response_text.strip().replace('```json', '').replace('```', '').strip())
+    except json.JSONDecodeError:
+        names = {}
+    used = {q["column"] for q in questions if q.get("column")}
+    for question in questions:
+        if question.get("column"):
+            continue
+        suggested = names.get(question["id"]) if isinstance(names, dict) else None
+        base = re.sub(r"[^A-Z0-9_]", "_", str(suggested or question["id"]).upper())[:25]
+        # Column names must stay unique in the template
+        name, suffix = base, 2
+        while name in used:
+            name = f"{base[:22]}_{suffix}"
+            suffix += 1
+        used.add(name)
+        question["column"] = name
+    return questions
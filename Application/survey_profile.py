@@ -0,0 +1,215 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import survey_store
+
+# Columns of datasets up to this many rows are profiled exactly; larger ones from a fixed-size random sample
+EXACT_ROWS = int(os.getenv("PROFILE_EXACT_ROWS", "200000"))
+SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "50000"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROFILE_PROMPT_TOKENS", "1500"))
+TOP_VALUES = 5
+VALUE_CHARS = 40
+# Profiled tables (up to SAMPLE_ROWS rows each) kept in memory, least recently used dropped first
+SAMPLE_CACHE_ENTRIES = 8
+
+_cache_lock = threading.Lock()
+# dataset hash -> {column: stats}, mirrored to <hash>.profile.json next to the dataset
+_stats_cache = {}
+_sample_cache = OrderedDict()
+
+
+def profile_path(dataset_hash):
+    return os.path.join(survey_store.STORE_DIR, f"{dataset_hash}.profile.json")
+
+
+def _load_stats(dataset_hash):
+    with _cache_lock:
+        if dataset_hash not in _stats_cache:
+            try:
+                with open(profile_path(dataset_hash), encoding="utf-8") as f:
+                    _stats_cache[dataset_hash] = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                _stats_cache[dataset_hash] = {}
+        return _stats_cache[dataset_hash]
+
+
+def _save_stats(dataset_hash, stats):
+    path = profile_path(dataset_hash)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def profiled_table(dataset_hash):
+    """The table stats are computed on: the whole dataset, or a seeded random sample of SAMPLE_ROWS rows"""
+    with _cache_lock:
+        if dataset_hash in _sample_cache:
+            _sample_cache.move_to_end(dataset_hash)
+            return _sample_cache[dataset_hash]
+    import numpy as np
+
+    table = survey_store.open_table(dataset_hash)
+    if table.num_rows > EXACT_ROWS:
+        rng = np.random.default_rng(int(dataset_hash[:8], 16))
+        indices = np.sort(rng.choice(table.num_rows, size=SAMPLE_ROWS, replace=False))
+        table = table.take(indices)
+    with _cache_lock:
+        _sample_cache[dataset_hash] = table
+        while len(_sample_cache) > SAMPLE_CACHE_ENTRIES:
+            _sample_cache.popitem(last=False)
+    return table
+
+
+def forget(dataset_hash):
+    """Drop the in-memory stats and sample of a dataset (called when the store evicts it)"""
+    with _cache_lock:
+        _stats_cache.pop(dataset_hash, None)
+        _sample_cache.pop(dataset_hash, None)
+
+
+survey_store.on_evict(forget)
+
+
+def column_stats(dataset_hash, column):
+    """Statistics of one column, computed on first use and cached by dataset hash"""
+    stats = _load_stats(dataset_hash)
+    if column in stats:
+        return stats[column]
+    table = survey_store.open_table(dataset_hash)
+    if column not in table.column_names:
+        raise Exception(f"Column not found: {column}")
+    sample = profiled_table(dataset_hash)
+    result = _compute_stats(sample.column(column))
+    result['sampled'] = sample.num_rows < table.num_rows
+    with _cache_lock:
+        stats[column] = result
+        _save_stats(dataset_hash, stats)
+    return result
+
+
+def _compute_stats(column):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rows = len(column)
+    categorical = pa.types.is_dictionary(column.type)
+    if categorical:
+        column = column.cast(column.type.value_type)
+    result = {
+        'type': 'category' if categorical else str(column.type),
+        'missing_pct': round(100 * column.null_count / rows, 1) if rows else 0.0,
+    }
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        min_max = pc.min_max(column)
+        result.update(
+            min=_round(min_max['min'].as_py()),
+            max=_round(min_max['max'].as_py()),
+            mean=_round(pc.mean(column).as_py()),
+            std=_round(pc.stddev(column).as_py()),
+            median=_round(pc.approximate_median(column).as_py()),
+        )
+        if pa.types.is_integer(column.type):
+            distinct = pc.count_distinct(column).as_py()
+            result['distinct'] = distinct
+            if distinct <= 12:
+                # Small integer scales (ratings 1-5, NPS 0-10) read better as a distribution
+                result['top'] = _top_values(column, rows, limit=12)
+        return result
+    if pa.types.is_temporal(column.type):
+        min_max = pc.min_max(column)
+        result.update(min=str(min_max['min'].as_py()), max=str(min_max['max'].as_py()))
+        return result
+    result['distinct'] = pc.count_distinct(column).as_py()
+    if result['distinct'] <= rows // 2:
+        result['top'] = _top_values(column, rows)
+    if not categorical and (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        lengths = pc.utf8_length(column)
+        result['avg_chars'] = _round(pc.mean(lengths).as_py())
+    return result
+
+
+def _top_values(column, rows, limit=TOP_VALUES):
+    import pyarrow.compute as pc
+
+    counts = pc.value_counts(column.drop_null())
+    pairs = sorted(zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()), key=lambda p: -p[1])
+    return [[_short(value), round(100 * count / rows, 1)] for value, count in pairs[:limit]]
+
+
+def _round(value, digits=3):
+    return round(value, digits) if isinstance(value, float) else value
+
+
+def _short(value):
+    text = str(value)
+    return text if len(text) <= VALUE_CHARS else text[:VALUE_CHARS - 1] + "…"
+
+
+def describe_column(name, stats):
+    """One compact prompt line for a column"""
+    parts = [f"{name} ({stats['type']}"]
+    if stats['missing_pct']:
+        parts.append(f", {stats['missing_pct']}% missing")
+    parts.append(")")
+    if 'mean' in stats:
+        parts.append(f": min {stats['min']}, median {stats['median']}, mean {stats['mean']}, max {stats['max']}")
+    elif 'min' in stats:
+        parts.append(f": {stats['min']} to {stats['max']}")
+    if 'top' in stats:
+        shown = ", ".join(f"{value} {pct}%" for value, pct in stats['top'])
+        parts.append(f"; {stats.get('distinct')} distinct; top: {shown}")
+    elif 'distinct' in stats:
+        parts.append(f"; {stats['distinct']} distinct")
+    if stats.get('avg_chars'):
+        parts.append(f"; avg {stats['avg_chars']:.0f} chars")
+    return "".join(parts)
+
+
+def prompt_profile(dataset_hash, question=None, token_budget=PROMPT_TOKEN_BUDGET):
+    """Token-budgeted text profile of a dataset for LLM prompts.
+
+    Columns named in the question come first; columns are described until the budget is used up and
+    the rest are listed by name only, so the profile size does not grow with file width or length.
+    """
+    table = survey_store.open_table(dataset_hash)
+    names = table.column_names
+    header = f"Dataset: {table.num_rows} rows x {len(names)} columns."
+    if table.num_rows > EXACT_ROWS:
+        header += f" Column statistics are estimated from a random sample of {SAMPLE_ROWS} rows."
+    budget = token_budget * 4 - len(header)
+
+    ordered = names
+    if question:
+        mentioned = [name for name in names if mentions_column(question, name)]
+        ordered = mentioned + [name for name in names if name not in mentioned]
+
+    lines = []
+    described = set()
+    remaining_names = sum(len(name) + 2 for name in names)
+    for name in ordered:
+        remaining_names -= len(name) + 2
+        line = "- " + describe_column(name, column_stats(dataset_hash, name))
+        # Keep room for listing the columns that are not described
+        if len(line) + 1 > budget - min(remaining_names, budget // 3):
+            break
+        lines.append(line)
+        described.add(name)
+        budget -= len(line) + 1
+    rest = [name for name in names if name not in described]
+    if rest:
+        listed = ", ".join(rest)
+        if len(listed) > max(budget, 0):
+            listed = listed[:max(budget, 0)].rsplit(", ", 1)[0] + ", …"
+        lines.append(f"- Other columns ({len(rest)}): {listed}")
+    return "\n".join([header, "Columns:"] + lines)
+
+
+def mentions_column(question, column):
+    # Match on words, so "age" finds AGE and "purchase date" finds PURCHASE_DATE
+    words = [w for w in re.split(r"[\W_]+", column.lower()) if w]
+    text = question.lower()
+    return bool(words) and all(re.search(rf"\b{re.escape(w)}", text) for w in words)
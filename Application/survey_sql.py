@@ -0,0 +1,108 @@
+import os
+import re
+import threading
+
+import survey_store
+
+# Name of the survey table in generated SQL
+TABLE_NAME = "survey"
+SQL_THREADS = int(os.getenv("SQL_THREADS", str(os.cpu_count() or 4)))
+SQL_MEMORY_LIMIT = os.getenv("SQL_MEMORY_LIMIT", "2GB")
+MAX_RESULT_ROWS = 10_000
+
+_connection = None
+_connection_lock = threading.Lock()
+
+_READ_ONLY_SQL = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+
+
+def is_available():
+    """SQL mode needs DuckDB, which older deployments may not have installed"""
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _get_connection():
+    """One in-process DuckDB database per server, with file access disabled for generated queries"""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            import duckdb
+            spill_dir = os.path.join(survey_store.STORE_DIR, "duckdb_spill")
+            os.makedirs(spill_dir, exist_ok=True)
+            connection = duckdb.connect(config={
+                'threads': SQL_THREADS,
+                'memory_limit': SQL_MEMORY_LIMIT,
+                # Operators that outgrow memory_limit spill here instead of failing
+                'temp_directory': spill_dir,
+            })
+            connection.execute("SET enable_external_access = false")
+            _connection = connection
+        return _connection
+
+
+def run_query(dataset_hash, sql, max_rows=MAX_RESULT_ROWS):
+    """Run one read-only query against the dataset (as table `survey`) and return a DataFrame"""
+    sql = sql.strip().rstrip(";").strip()
+    if not _READ_ONLY_SQL.match(sql) or ";" in sql:
+        raise Exception("Only a single SELECT query is allowed.")
+    # Each query gets its own cursor so concurrent sessions do not share state
+    cursor = _get_connection().cursor()
+    try:
+        # The memory-mapped Arrow table is scanned in place: nothing is copied into DuckDB
+        cursor.register(TABLE_NAME, survey_store.open_table(dataset_hash))
+        result = cursor.execute(f"SELECT * FROM ({sql}) AS q LIMIT {int(max_rows) + 1}").fetch_arrow_table()
+    except Exception as e:
+        raise Exception(f"SQL error: {str(e)}")
+    finally:
+        cursor.close()
+    frame = result.to_pandas()
+    if len(frame) > max_rows:
+        frame = frame.head(max_rows)
+    return frame
+
+
+def schema_prompt(dataset_hash):
+    """Column names and SQL types of the survey table for the LLM prompt"""
+    table = survey_store.open_table(dataset_hash)
+    columns = ", ".join(f'"{field.name}" {_sql_type(field.type)}' for field in table.schema)
+    return f"{TABLE_NAME}({columns})"
+
+
+def _sql_type(arrow_type):
+    import pyarrow as pa
+    if pa.types.is_dictionary(arrow_type):
+        return "VARCHAR"
+    if pa.types.is_integer(arrow_type):
+        return "BIGINT"
+    if pa.types.is_floating(arrow_type):
+        return "DOUBLE"
+    if pa.types.is_boolean(arrow_type):
+        return "BOOLEAN"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    return "VARCHAR"
+
+
+def result_to_analysis(frame, title, chart=None):
+    """Wrap a query result for the analyzer's table/figure display"""
+    import pandas as pd
+    from survey_analytics import AnalysisResult
+
+    if frame.shape[1] >= 2 and chart != 'table':
+        # First column labels the rows; the rest are plotted
+        frame = frame.set_index(frame.columns[0])
+    numeric = frame.select_dtypes('number')
+    if chart is None:
+        chart = 'table'
+        if len(frame) and not numeric.empty:
+            index_is_time = pd.api.types.is_datetime64_any_dtype(frame.index) or frame.index.name and re.search(r"date|month|year|week|day|time|period", str(frame.index.name), re.IGNORECASE)
+            chart = 'line' if index_is_time else 'bar'
+    if chart in ('bar', 'line'):
+        frame = numeric if not numeric.empty else frame
+    return AnalysisResult(frame, title, chart)
@@ -0,0 +1,168 @@
+import os
+import tempfile
+import threading
+import uuid
+
+import result_cache
+
+# Parsed survey datasets as uncompressed Arrow IPC (Feather v2) files, keyed by the upload's SHA-256
+STORE_DIR = os.path.join(tempfile.gettempdir(), "suzuki_survey_store")
+MAX_BYTES = int(os.getenv("SURVEY_STORE_MB", "8192")) * 1024 * 1024
+
+# String columns with at most this many distinct values (and mostly repeats) become categoricals
+CATEGORY_MAX_UNIQUE = 1000
+CATEGORY_MAX_RATIO = 0.5
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+_ingest_locks = {}
+_ingest_locks_guard = threading.Lock()
+# Modules holding per-dataset state in memory register here (see on_evict)
+_evict_callbacks = []
+
+
+def dataset_path(dataset_hash):
+    return os.path.join(STORE_DIR, f"{dataset_hash}.arrow")
+
+
+def ingest(uploaded_file, filename):
+    """Hash the upload, parse it once into the store, and return its dataset hash.
+
+    Uploads whose content is already stored (from a rerun or another user) are not parsed again.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower()
+    raw_path = os.path.join(STORE_DIR, f".upload.{uuid.uuid4().hex}{extension}")
+    try:
+        dataset_hash = result_cache.copy_and_hash(uploaded_file, raw_path)
+        with ingest_lock(dataset_hash):
+            path = dataset_path(dataset_hash)
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                write_dataset(read_table(raw_path, extension), path)
+                evict()
+    finally:
+        if os.path.exists(raw_path):
+            os.unlink(raw_path)
+    return dataset_hash
+
+
+def ingest_lock(dataset_hash):
+    # Two sessions uploading the same file parse it once
+    with _ingest_locks_guard:
+        return _ingest_locks.setdefault(dataset_hash, threading.Lock())
+
+
+def read_table(path, extension):
+    """Parse a CSV (multithreaded Arrow reader) or Excel file into an Arrow table with categorical answers"""
+    return encode_categoricals(parse_table(path, extension))
+
+
+def parse_table(path, extension):
+    """Parse a survey file into a plain Arrow table (no categorical encoding)"""
+    import pyarrow as pa
+
+    if extension == '.csv':
+        from pyarrow import csv
+        table = csv.read_csv(
+            path,
+            read_options=csv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+            convert_options=csv.ConvertOptions(strings_can_be_null=True),
+        )
+    elif extension in ('.xlsx', '.xls'):
+        import pandas as pd
+        frame = pd.read_excel(path)
+        # Mixed-type object columns (e.g. numbers and text in one answer column) are kept as text
+        for column in frame.columns[frame.dtypes == object]:
+            frame[column] = frame[column].map(lambda value: value if value is None or isinstance(value, str) or value != value else str(value))
+        frame.columns = [str(column) for column in frame.columns]
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    else:
+        raise Exception(f"Unsupported survey file format: {extension}")
+    return table
+
+
+def encode_categoricals(table):
+    """Dictionary-encode low-cardinality string columns (Likert scales, Yes/No, city, ...)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = []
+    for column in table.columns:
+        if (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)) and table.num_rows:
+            distinct = pc.count_distinct(column).as_py()
+            if distinct <= CATEGORY_MAX_UNIQUE and distinct <= CATEGORY_MAX_RATIO * table.num_rows:
+                column = column.dictionary_encode()
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def write_dataset(table, path):
+    # Uncompressed so readers can memory-map the columns instead of decoding them
+    from pyarrow import feather
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def open_table(dataset_hash):
+    """Memory-mapped Arrow table of a stored dataset; pages are shared by every process reading it"""
+    import pyarrow as pa
+
+    path = dataset_path(dataset_hash)
+    if not os.path.exists(path):
+        raise Exception("Survey dataset not found. Please upload the file again.")
+    os.utime(path)
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def load_dataframe(dataset_hash):
+    """DataFrame view of a stored dataset: text columns stay Arrow-backed on the mapped file, answers are categoricals"""
+    import pandas as pd
+    import pyarrow as pa
+
+    def types_mapper(arrow_type):
+        if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            return pd.ArrowDtype(arrow_type)
+        return None
+
+    return open_table(dataset_hash).to_pandas(types_mapper=types_mapper, split_blocks=True, date_as_object=False)
+
+
+def on_evict(callback):
+    """Register callback(dataset_hash), called after a dataset is evicted, to drop in-memory caches of it"""
+    _evict_callbacks.append(callback)
+
+
+def evict(max_bytes=None):
+    """Delete least recently used datasets until the store fits max_bytes"""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for entry in os.scandir(STORE_DIR):
+        if entry.name.endswith('.arrow'):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    # Never evict the newest dataset: it was just written for the current upload
+    for _, size, path in entries[:-1]:
+        if total <= max_bytes:
+            break
+        # Open memory maps keep working on Linux after the file is unlinked
+        os.unlink(path)
+        total -= size
+        dataset_hash = os.path.basename(path)[:-len('.arrow')]
+        remove_sidecars(dataset_hash)
+        for callback in _evict_callbacks:
+            callback(dataset_hash)
+
+
+def remove_sidecars(dataset_hash):
+    """Delete the files derived from a dataset (profile, caches), named <hash>.<suffix>"""
+    for entry in os.scandir(STORE_DIR):
+        if entry.name.startswith(dataset_hash + '.') and entry.is_file():
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
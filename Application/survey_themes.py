@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Columns with fewer distinct answers than this are summarized from the full text, as before
+MIN_RESPONSES_TO_CLUSTER = int(os.getenv("THEMES_MIN_RESPONSES", "60"))
+MAX_THEMES = int(os.getenv("THEMES_MAX", "10"))
+REPRESENTATIVES = int(os.getenv("THEMES_REPRESENTATIVES", "4"))
+REPRESENTATIVE_CHARS = 300
+KEYWORDS = 6
+MEMO_ENTRIES = 64
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+class Theme:
+    def __init__(self, size, keywords, representatives):
+        self.size = size
+        self.keywords = keywords
+        self.representatives = representatives
+
+
+def cluster_responses(texts, max_themes=MAX_THEMES, representatives=REPRESENTATIVES):
+    """Group free-text answers into themes with TF-IDF and mini-batch k-means, largest theme first.
+
+    Identical answers are clustered once with their count as weight. Returns None when there are
+    too few distinct answers (or too little vocabulary) for clustering to be meaningful.
+    """
+    import numpy as np
+    import pandas as pd
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    counts = pd.Series(texts, dtype=object).astype(str).str.strip()
+    counts = counts[counts != ""].value_counts()
+    if len(counts) < MIN_RESPONSES_TO_CLUSTER:
+        return None
+    answers = counts.index.tolist()
+    weights = counts.to_numpy(dtype=float)
+
+    vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), min_df=2, max_features=20000, sublinear_tf=True)
+    try:
+        matrix = vectorizer.fit_transform(answers)
+    except ValueError:
+        # Empty vocabulary: answers share no words
+        return None
+    n_themes = max(2, min(max_themes, int(np.sqrt(len(answers) / 5))))
+    model = MiniBatchKMeans(n_clusters=n_themes, random_state=0, n_init=3, batch_size=2048)
+    labels = model.fit_predict(matrix, sample_weight=weights)
+
+    terms = vectorizer.get_feature_names_out()
+    # Rows are L2-normalized, so the dot product with a centroid ranks answers by closeness to it
+    closeness = np.asarray((matrix @ model.cluster_centers_.T))
+    themes = []
+    for label in range(n_themes):
+        members = np.flatnonzero(labels == label)
+        if not len(members):
+            continue
+        nearest = members[np.argsort(-closeness[members, label])][:representatives]
+        keywords = [terms[i] for i in np.argsort(-model.cluster_centers_[label])[:KEYWORDS]]
+        themes.append(Theme(
+            int(weights[members].sum()),
+            keywords,
+            [_short(answers[i]) for i in nearest],
+        ))
+    themes.sort(key=lambda theme: -theme.size)
+    return themes
+
+
+def column_themes(dataset_hash, df, column):
+    """Themes of a text column, memoized per (dataset hash, column)"""
+    key = (dataset_hash, column)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    themes = cluster_responses(df[column].dropna().tolist())
+    with _memo_lock:
+        _memo[key] = themes
+        while len(_memo) > MEMO_ENTRIES:
+            _memo.popitem(last=False)
+    return themes
+
+
+def themes_prompt(themes):
+    """Themes with sizes, keywords and representative answers for the summarization prompt"""
+    total = sum(theme.size for theme in themes)
+    blocks = []
+    for number, theme in enumerate(themes, 1):
+        examples = "\n".join(f'  - "{text}"' for text in theme.representatives)
+        blocks.append(f"Theme {number}: {theme.size} responses ({100 * theme.size / total:.1f}%); keywords: {', '.join(theme.keywords)}\n{examples}")
+    return "\n\n".join(blocks)
+
+
+def themes_table(themes):
+    """Markdown table of theme sizes for the chat"""
+    total = sum(theme.size for theme in themes)
+    rows = ["| Theme | Responses | Share | Keywords |", "|---|---:|---:|---|"]
+    for number, theme in enumerate(themes, 1):
+        rows.append(f"| {number} | {theme.size} | {100 * theme.size / total:.1f}% | {', '.join(theme.keywords)} |")
+    return "\n".join(rows)
+
+
+def _short(text):
+    text = " ".join(text.split())
+    return text if len(text) <= REPRESENTATIVE_CHARS else text[:REPRESENTATIVE_CHARS - 1] + "…"
@@ -0,0 +1,204 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import workspace
+
+# Measured bytes/second per file type and stage, shared by all workers; drives the ETA of later jobs
+THROUGHPUT_PATH = os.path.join(workspace.WORKSPACE_ROOT, "stage_throughput.json")
+# Weight of the newest measurement in the moving average
+THROUGHPUT_SMOOTHING = 0.3
+
+_current_tracer = contextvars.ContextVar("tracer", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+_throughput_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, trace_id=None, parent_id=None, attrs=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        """Attach measurements known only once the work is done (output bytes, page count, ...)"""
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'thread': threading.current_thread().name,
+            'error': self.error,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    """Collects the spans of one traced operation and appends each finished span to a JSON-lines file"""
+
+    def __init__(self, path=None, trace_id=None):
+        self.path = path
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        parent = _current_span.get()
+        span = Span(name, self.trace_id, parent.span_id if parent else None, attrs)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            self._record(span)
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+
+    def summary(self):
+        """Total count, seconds, bytes and pages per span name"""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = totals.setdefault(span.name, {'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] = round(entry['seconds'] + span.duration, 3)
+            for key in ('bytes', 'pages'):
+                if isinstance(span.attrs.get(key), (int, float)):
+                    entry[key] = entry.get(key, 0) + span.attrs[key]
+        return totals
+
+
+@contextmanager
+def activate(tracer):
+    """Make tracer the target of span() calls in this context"""
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block under the active tracer; without one, the span is measured nowhere and costs nothing"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield Span(name, attrs=attrs)
+        return
+    with tracer.span(name, **attrs) as s:
+        yield s
+
+
+def propagate(fn):
+    """Wrap fn so it runs with the caller's tracer and parent span, e.g. when handed to a thread pool"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+# --- Throughput model for ETAs ---
+
+def _load_throughput():
+    try:
+        with open(THROUGHPUT_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def record_throughput(kind, stage, input_bytes, seconds):
+    """Fold one measured stage (input size and duration) into the moving average for kind/stage"""
+    if input_bytes <= 0 or seconds <= 0:
+        return
+    rate = input_bytes / seconds
+    with _throughput_lock:
+        stats = _load_throughput()
+        previous = stats.setdefault(kind, {}).get(stage)
+        stats[kind][stage] = rate if previous is None else THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * previous
+        os.makedirs(os.path.dirname(THROUGHPUT_PATH), exist_ok=True)
+        tmp_path = f"{THROUGHPUT_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, THROUGHPUT_PATH)
+
+
+def estimate_stage_seconds(kind, stage, input_bytes):
+    """Expected duration of a stage from past throughput, or None if it has never been measured"""
+    rate = _load_throughput().get(kind, {}).get(stage)
+    if not rate:
+        return None
+    return input_bytes / rate
+
+
+class StageClock:
+    """Times the stages of one job, feeds the throughput model and estimates the time left"""
+
+    def __init__(self, kind, input_bytes, stages):
+        self.kind = kind
+        self.input_bytes = input_bytes
+        self.stages = list(stages)
+        self.estimates = {name: estimate_stage_seconds(kind, name, input_bytes) for name in self.stages}
+        self.current = None
+        self.started = None
+        self.timings = {}
+
+    def enter(self, name):
+        if name == self.current:
+            return
+        self.finish()
+        self.current = name
+        self.started = time.perf_counter()
+
+    def finish(self):
+        if self.current is None:
+            return
+        seconds = time.perf_counter() - self.started
+        self.timings[self.current] = round(seconds, 3)
+        if self.current in self.estimates:
+            record_throughput(self.kind, self.current, self.input_bytes, seconds)
+        self.current = None
+
+    def eta(self, fraction=None):
+        """Seconds left in the job, or None while there is nothing to base an estimate on.
+
+        Within a stage that reports its own progress fraction, the measured pace of this job wins
+        over the historical average.
+        """
+        if self.current not in self.estimates:
+            return None
+        elapsed = time.perf_counter() - self.started
+        if fraction is not None and fraction >= 0.05:
+            remaining = elapsed * (1 - fraction) / fraction
+        elif self.estimates[self.current] is not None:
+            remaining = max(self.estimates[self.current] - elapsed, 0)
+        else:
+            return None
+        later = self.stages[self.stages.index(self.current) + 1:]
+        if any(self.estimates[name] is None for name in later):
+            return None
+        return remaining + sum(self.estimates[name] for name in later)
@@ -0,0 +1,376 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import result_cache
+import tracing
+import workspace
+
+# Every job lives in its own workspace: job.json (state), the input file, the output and the texts
+JOBS_AREA = "jobs"
+MAX_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "2"))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# Streamed .txt jobs keep only this much of the original and translated text for previews
+PREVIEW_CHARS = 100_000
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_dir(job_id):
+    return os.path.join(workspace.area_dir(JOBS_AREA), job_id)
+
+
+def read_job(job_id):
+    """Load the persisted state of a job (None if it does not exist)"""
+    try:
+        with open(os.path.join(job_dir(job_id), "job.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def update_job(job_id, **fields):
+    """Merge fields into job.json; written atomically so pollers never see a partial file"""
+    job = read_job(job_id) or {}
+    job.update(fields, updated_at=time.time())
+    path = os.path.join(job_dir(job_id), "job.json")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return job
+
+
+def create_job(filename, src_file, source_lang, target_lang, use_ocr=False, layout_mode=None):
+    """Stream the upload into a new job workspace, hashing it on the way, and return the job id"""
+    job_id = uuid.uuid4().hex
+    # Raises workspace.WorkspaceFull if the upload does not fit the disk quota
+    workspace.create(JOBS_AREA, getattr(src_file, "size", 0), name=job_id)
+    input_path = os.path.join(job_dir(job_id), "input" + Path(filename).suffix.lower())
+    content_hash = result_cache.copy_and_hash(src_file, input_path)
+    update_job(
+        job_id,
+        id=job_id,
+        filename=filename,
+        input_path=input_path,
+        content_hash=content_hash,
+        cache_key=result_cache.result_key(content_hash, source_lang, target_lang, use_ocr, layout_mode),
+        source_lang=source_lang,
+        target_lang=target_lang,
+        use_ocr=use_ocr,
+        layout_mode=layout_mode,
+        status=QUEUED,
+        stage='queued',
+        progress=0,
+        message="Waiting for a worker...",
+        created_at=time.time(),
+    )
+    return job_id
+
+
+def is_cancel_requested(job_id):
+    # A separate flag file, so the UI never races the worker's job.json writes
+    return os.path.exists(os.path.join(job_dir(job_id), "cancel"))
+
+
+def load_result(job_id):
+    """Return the result dict of a finished job in the shape the translator UI expects"""
+    job = read_job(job_id)
+    if not job or job['status'] != DONE:
+        return {'success': False, 'error': (job or {}).get('error', "Job not found")}
+    folder = job_dir(job_id)
+    with open(os.path.join(folder, "original.txt"), encoding="utf-8") as f:
+        original_text = f.read()
+    with open(os.path.join(folder, "translated.txt"), encoding="utf-8") as f:
+        translated_text = f.read()
+    return {
+        'success': True,
+        'original_text': original_text,
+        'translated_text': translated_text,
+        'output_path': job['output_path'],
+        'source_lang': job['source_lang'],
+        'detected_lang': job.get('detected_lang'),
+        'timings': job.get('timings'),
+    }
+
+
+# --- Worker side ---
+
+_worker_translator = None
+
+
+def _get_worker_translator():
+    # One FileTranslator (and warmed font registry) per worker process
+    global _worker_translator
+    if _worker_translator is None:
+        from Translator import FileTranslator
+        _worker_translator = FileTranslator()
+    return _worker_translator
+
+
+def job_stages(extension, layout_mode=None):
+    """Timed stages of a job, in order, by input type"""
+    if extension == '.txt':
+        return ['translate']
+    if extension == '.docx':
+        return ['translate', 'save']
+    if extension == '.pdf' and layout_mode:
+        # Blocks are translated while the layout is rebuilt
+        return ['extract', 'translate']
+    return ['extract', 'translate', 'save']
+
+
+def run_job(job_id):
+    """Worker entry point: extract, translate and save one job, persisting progress per stage"""
+    job = read_job(job_id)
+    extension = Path(job['filename']).suffix.lower()
+    # Spans of every FileTranslator stage go to the job's trace file; stage timings feed the ETA
+    tracer = tracing.Tracer(os.path.join(job_dir(job_id), "trace.jsonl"), trace_id=job_id)
+    clock = tracing.StageClock(f"{extension}:{job['layout_mode']}", os.path.getsize(job['input_path']), job_stages(extension, job['layout_mode']))
+
+    def stage(name, progress, message, fraction=None, **fields):
+        if is_cancel_requested(job_id):
+            raise JobCancelled()
+        clock.enter(name)
+        eta = clock.eta(fraction)
+        update_job(job_id, stage=name, progress=progress, message=message, eta_seconds=round(eta) if eta is not None else None, **fields)
+
+    update_job(job_id, status=RUNNING, started_at=time.time())
+    try:
+        with tracing.activate(tracer), tracer.span('job', format=extension, bytes=clock.input_bytes):
+            _run_stages(job_id, job, extension, stage)
+        clock.finish()
+        update_job(job_id, status=DONE, stage='done', progress=100, message="Translation completed!", eta_seconds=0, timings=clock.timings, trace=tracer.summary(), finished_at=time.time())
+    except JobCancelled:
+        update_job(job_id, status=CANCELLED, stage='cancelled', message="Cancelled", eta_seconds=None, trace=tracer.summary(), finished_at=time.time())
+    except Exception as e:
+        update_job(job_id, status=FAILED, stage='failed', error=str(e), message="Translation failed", eta_seconds=None, trace=tracer.summary(), finished_at=time.time())
+    finally:
+        # Finished jobs stay for download until the sweeper reclaims them
+        workspace.mark_idle(job_dir(job_id))
+    return job_id
+
+
+def _run_stages(job_id, job, extension, stage):
+    """Extract, translate and save the job's file; the caller records the outcome"""
+    from Translator import detect_language
+    translator = _get_worker_translator()
+    input_path = job['input_path']
+    source_lang, target_lang = job['source_lang'], job['target_lang']
+    output_path = os.path.join(job_dir(job_id), f"{Path(job['filename']).stem}_translated_{target_lang}{extension}")
+
+    if extension == '.txt':
+        # Written straight to output_path batch by batch; only previews are kept in memory
+        original_text, translated_text = _translate_txt_streaming(translator, input_path, output_path, source_lang, target_lang, stage)
+    elif extension == '.docx':
+        original_text, translated_text = _translate_docx_streaming(translator, job_id, input_path, source_lang, target_lang, stage)
+        stage('save', 80, "Preparing download...")
+        translator.save_translated_file(input_path, translated_text, output_path, target_lang=target_lang)
+    else:
+        stage('extract', 20, "Extracting text from file...")
+        original_text = translator.extract_text_from_file(input_path, job['use_ocr'])
+        if not original_text.strip():
+            raise Exception("No text content found in the file. Try enabling OCR if it's a scanned PDF.")
+        translated_text = None
+        if extension == '.pdf' and job['layout_mode']:
+            # One translation pass: the preview and translated.txt come from the block translations
+            stage('translate', 40, "Translating and laying out pages...")
+            try:
+                translated_text = translator.translate_pdf_layout(input_path, output_path, source_lang, target_lang, job['layout_mode'],
+                                                                  should_stop=lambda: is_cancel_requested(job_id))
+            except Exception as e:
+                if is_cancel_requested(job_id):
+                    raise JobCancelled()
+                print(f"Structure-preserving PDF output failed ({str(e)}), using simple layout")
+        if translated_text is None:
+            stage('translate', 40, "Translating text...")
+            translated_text = translator.translate_text(original_text, source_lang, target_lang)
+            stage('save', 80, "Preparing download...")
+            translator.save_translated_file(input_path, translated_text, output_path, target_lang=target_lang)
+
+    if not original_text.strip():
+        raise Exception("No text content found in the file.")
+    # Local script detection is free, so every upload gets a source-language sanity check
+    update_job(job_id, detected_lang=detect_language(original_text))
+
+    with open(os.path.join(job_dir(job_id), "original.txt"), "w", encoding="utf-8") as f:
+        f.write(original_text)
+    with open(os.path.join(job_dir(job_id), "translated.txt"), "w", encoding="utf-8") as f:
+        f.write(translated_text)
+    # A cancel that landed after the last stage check may have cut the text short: never cache or serve it
+    if is_cancel_requested(job_id):
+        raise JobCancelled()
+    if not os.path.exists(output_path):
+        raise Exception(f"The translated file was not written: {os.path.basename(output_path)}")
+    # Keep the result for identical later uploads (same content, languages and options)
+    result_cache.put(job['cache_key'], {
+        "output" + extension: output_path,
+        "original.txt": os.path.join(job_dir(job_id), "original.txt"),
+        "translated.txt": os.path.join(job_dir(job_id), "translated.txt"),
+    })
+    update_job(job_id, output_path=output_path)
+
+
+def _translate_txt_streaming(translator, input_path, output_path, source_lang, target_lang, stage):
+    """Translate a text file in constant memory, returning previews of the original and translation"""
+    original_preview = _read_head(input_path)
+    if not original_preview.strip():
+        raise Exception("No text content found in the file.")
+
+    def on_batch(fraction, batches_done, last_translated):
+        stage('translate', 20 + int(fraction * 75), f"Translated {batches_done} batch(es)...", fraction=fraction, preview=last_translated[:300])
+
+    stage('translate', 20, "Translating text in batches...")
+    translator.translate_text_file_streaming(input_path, output_path, source_lang, target_lang, progress_callback=on_batch)
+    return original_preview, _read_head(output_path)
+
+
+def _read_head(path, max_chars=PREVIEW_CHARS):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read(max_chars)
+
+
+def _translate_docx_streaming(translator, job_id, docx_path, source_lang, target_lang, stage):
+    """Translate a Word document batch by batch while its XML is still being parsed"""
+    from docx_stream import iter_docx_text
+
+    original_parts = []
+    translated_parts = []
+    parsed = [0.0]
+
+    def on_progress(fraction):
+        parsed[0] = fraction
+
+    def paragraphs():
+        for kind, text in iter_docx_text(docx_path, progress_callback=on_progress, should_stop=lambda: is_cancel_requested(job_id)):
+            original_parts.append(text)
+            if text.strip():
+                yield text
+
+    stage('translate', 20, "Extracting and translating text...")
+    for translated_batch in translator.translate_stream(paragraphs(), source_lang, target_lang):
+        translated_parts.append(translated_batch)
+        stage('translate', 20 + int(parsed[0] * 60), f"Translated {len(translated_parts)} section(s)...", fraction=parsed[0])
+    # iter_docx_text ends early on cancel, which would otherwise look like the end of the document
+    if is_cancel_requested(job_id):
+        raise JobCancelled()
+
+    return "\n".join(original_parts), "\n".join(translated_parts)
+
+
+# --- Server side ---
+
+class TranslationJobQueue:
+    """Runs translation jobs in a pool of worker processes; state is persisted per job on disk"""
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        workspace.start_sweeper()
+        self.max_workers = max_workers
+        self.executor = self._new_executor()
+        # job id -> (executor it was submitted to, future)
+        self.futures = {}
+        self._lock = threading.Lock()
+
+    def _new_executor(self):
+        # spawn: never fork the (multi-threaded) Streamlit server
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, filename, src_file, source_lang, target_lang, use_ocr=False, layout_mode=None):
+        job_id = create_job(filename, src_file, source_lang, target_lang, use_ocr, layout_mode)
+        if not self._reuse_cached_result(job_id):
+            with self._lock:
+                self._collect_finished()
+                try:
+                    future = self.executor.submit(run_job, job_id)
+                except BrokenProcessPool:
+                    self._replace_executor(self.executor)
+                    future = self.executor.submit(run_job, job_id)
+                self.futures[job_id] = (self.executor, future)
+        return job_id
+
+    def _replace_executor(self, broken):
+        """A worker died (segfault, OOM kill): fail the jobs the broken pool still held and start a new pool"""
+        if self.executor is not broken:
+            return
+        print("Translation worker pool is broken; starting a new one")
+        for job_id, (executor, future) in list(self.futures.items()):
+            if executor is broken:
+                self._finish_crashed(job_id, "a translation worker process died")
+                del self.futures[job_id]
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = self._new_executor()
+
+    def _finish_crashed(self, job_id, reason):
+        job = read_job(job_id)
+        if job and job['status'] not in FINISHED_STATUSES:
+            update_job(job_id, status=FAILED, stage='failed', error=f"Worker crashed: {reason}", message="Translation failed", finished_at=time.time())
+            workspace.mark_idle(job_dir(job_id))
+
+    def _collect(self, job_id):
+        """Settle a finished future: record crashes, replace a broken pool, and forget the future"""
+        executor, future = self.futures.pop(job_id)
+        error = future.exception() if not future.cancelled() else None
+        if error is not None:
+            self._finish_crashed(job_id, str(error) or type(error).__name__)
+            if isinstance(error, BrokenProcessPool):
+                self._replace_executor(executor)
+
+    def _collect_finished(self):
+        for job_id in [job_id for job_id, (_, future) in self.futures.items() if future.done()]:
+            if job_id in self.futures:
+                self._collect(job_id)
+
+    def _reuse_cached_result(self, job_id):
+        """Finish the job straight from the result store if this exact translation exists"""
+        job = read_job(job_id)
+        entry = result_cache.get(job['cache_key'])
+        if entry is None:
+            return False
+        extension = Path(job['filename']).suffix.lower()
+        output_path = os.path.join(job_dir(job_id), f"{Path(job['filename']).stem}_translated_{job['target_lang']}{extension}")
+        try:
+            result_cache.restore(entry, "output" + extension, output_path)
+            result_cache.restore(entry, "original.txt", os.path.join(job_dir(job_id), "original.txt"))
+            result_cache.restore(entry, "translated.txt", os.path.join(job_dir(job_id), "translated.txt"))
+        except FileNotFoundError:
+            # Entry was evicted while we were reading it
+            return False
+        update_job(job_id, status=DONE, stage='done', progress=100, message="Reused an earlier translation of this file", output_path=output_path, cached=True, finished_at=time.time())
+        workspace.mark_idle(job_dir(job_id))
+        return True
+
+    def status(self, job_id):
+        """Current job state; marks the job failed if its worker process died"""
+        with self._lock:
+            entry = self.futures.get(job_id)
+            if entry is not None and entry[1].done():
+                self._collect(job_id)
+        return read_job(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job immediately, or ask a running job to stop at its next stage boundary"""
+        Path(job_dir(job_id), "cancel").touch()
+        entry = self.futures.get(job_id)
+        if entry is not None and entry[1].cancel():
+            update_job(job_id, status=CANCELLED, stage='cancelled', message="Cancelled", finished_at=time.time())
+            workspace.mark_idle(job_dir(job_id))
+
+    def remove(self, job_id):
+        """Delete a finished job and its files"""
+        self.futures.pop(job_id, None)
+        workspace.remove(job_dir(job_id))
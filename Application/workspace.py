@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# All per-request translation artifacts live below this root, one directory per job
+WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "suzuki_workspace")
+QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_MB", "4096")) * 1024 * 1024
+MAX_AGE_SECONDS = int(os.getenv("WORKSPACE_MAX_AGE_HOURS", "24")) * 3600
+SWEEP_INTERVAL_SECONDS = int(os.getenv("WORKSPACE_SWEEP_SECONDS", "300"))
+
+# Workspaces in use carry this marker and are never swept, unless they have had no writes for hours
+ACTIVE_MARKER = ".active"
+STALE_ACTIVE_SECONDS = 6 * 3600
+
+_sweeper_lock = threading.Lock()
+_sweeper_started = False
+
+
+class WorkspaceFull(Exception):
+    pass
+
+
+def area_dir(area):
+    return os.path.join(WORKSPACE_ROOT, area)
+
+
+def create(area, incoming_bytes=0, name=None):
+    """Create a unique, active workspace directory under area, making room for incoming_bytes first"""
+    ensure_quota(incoming_bytes)
+    path = os.path.join(area_dir(area), name or uuid.uuid4().hex)
+    os.makedirs(path)
+    mark_active(path)
+    return path
+
+
+def mark_active(path):
+    with open(os.path.join(path, ACTIVE_MARKER), "w") as f:
+        f.write(str(os.getpid()))
+
+
+def mark_idle(path):
+    try:
+        os.unlink(os.path.join(path, ACTIVE_MARKER))
+    except FileNotFoundError:
+        pass
+
+
+def remove(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def temporary(area, incoming_bytes=0):
+    """Workspace that is removed as soon as the block exits, whatever happens inside it"""
+    path = create(area, incoming_bytes)
+    try:
+        yield path
+    finally:
+        remove(path)
+
+
+def list_workspaces():
+    """Return (path, last_used, size_bytes, active) for every workspace, oldest first"""
+    workspaces = []
+    if not os.path.isdir(WORKSPACE_ROOT):
+        return workspaces
+    now = time.time()
+    for area in os.scandir(WORKSPACE_ROOT):
+        if not area.is_dir():
+            continue
+        for entry in os.scandir(area.path):
+            if not entry.is_dir():
+                continue
+            last_used = entry.stat().st_mtime
+            size = 0
+            for root, _, files in os.walk(entry.path):
+                for name in files:
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    size += st.st_size
+                    last_used = max(last_used, st.st_mtime)
+            # An active workspace that has seen no writes for hours belongs to a dead process
+            active = os.path.exists(os.path.join(entry.path, ACTIVE_MARKER)) and now - last_used < STALE_ACTIVE_SECONDS
+            workspaces.append((entry.path, last_used, size, active))
+    workspaces.sort(key=lambda w: w[1])
+    return workspaces
+
+
+def sweep(max_age=None, quota=None, reserve_bytes=0):
+    """Remove idle workspaces older than max_age, then oldest idle ones until usage + reserve fits the quota.
+
+    Returns the number of bytes still in use.
+    """
+    max_age = MAX_AGE_SECONDS if max_age is None else max_age
+    quota = QUOTA_BYTES if quota is None else quota
+    now = time.time()
+    remaining = []
+    for path, last_used, size, active in list_workspaces():
+        if not active and now - last_used > max_age:
+            remove(path)
+        else:
+            remaining.append((path, size, active))
+    total = sum(size for _, size, _ in remaining)
+    for path, size, active in remaining:
+        if total + reserve_bytes <= quota:
+            break
+        if not active:
+            remove(path)
+            total -= size
+    return total
+
+
+def ensure_quota(incoming_bytes=0):
+    """Make room for incoming_bytes or raise WorkspaceFull"""
+    total = sweep(reserve_bytes=incoming_bytes)
+    if total + incoming_bytes > QUOTA_BYTES:
+        raise WorkspaceFull("The translation server is out of workspace disk space. Please try again later.")
+
+
+def start_sweeper(interval=SWEEP_INTERVAL_SECONDS):
+    """Start the background sweeper thread once per process"""
+    global _sweeper_started
+    with _sweeper_lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+
+    def loop():
+        while True:
+            try:
+                sweep()
+            except Exception as e:
+                print(f"Workspace sweep failed: {str(e)}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="workspace-sweeper", daemon=True).start()